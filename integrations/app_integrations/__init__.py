@@ -1,26 +1,189 @@
+import abc
+import asyncio
 import base64
+import contextvars
 import uuid
 from datetime import timedelta
 from urllib.parse import urlencode
 
-import requests
 import structlog
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
 from django.utils import timezone
 
+from integrations.http import get_io_executor, get_session
 from integrations.models import UserIntegration
+from integrations.ratelimit import rate_limiter
+from integrations.singleflight import flight_key, flights, single_flight
+from integrations.streams import ActivityFile, MultipartStream, open_activity_file
+from integrations.tracks import read_track
 from users.models import User
 
 logger = structlog.get_logger(__name__)
 
 
-class BaseIntegration:
+def _call_in_io_thread(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # io threads live outside the request cycle, so nothing else would
+        # release the database connections they open
+        close_old_connections()
+
+
+async def run_in_io_thread(func, *args, **kwargs):
+    return await sync_to_async(
+        _call_in_io_thread, thread_sensitive=False, executor=get_io_executor()
+    )(func, *args, **kwargs)
+
+
+def submit_to_io_thread(func, *args, **kwargs):
+    """
+    Runs `func` on the io thread pool from synchronous code and returns its
+    Future. Context variables such as the rate limit priority carry over.
+    """
+    context = contextvars.copy_context()
+    return get_io_executor().submit(
+        context.run, _call_in_io_thread, func, *args, **kwargs
+    )
+
+
+class BaseIntegration(abc.ABC):
+    # status to acknowledge webhook events with
+    WEBHOOK_EVENT_STATUS = 200
+    # whether webhook subscriptions are made per connected user rather than
+    # once for the whole application
+    PER_USER_WEBHOOK_SUBSCRIPTIONS = False
+    # file formats accepted by upload_activity, most preferred first
+    UPLOAD_FORMATS = ("tcx",)
+
     def __init__(self, user_integration):
         self.user_integration = user_integration
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # integrations are mostly used through their classmethods, so a
+        # missing method is reported when the class is defined rather than
+        # when it is first instantiated
+        missing = sorted(
+            name
+            for name in BaseIntegration.__abstractmethods__
+            if getattr(getattr(cls, name), "__isabstractmethod__", False)
+        )
+        if missing:
+            raise TypeError(f"{cls.__name__} does not implement {', '.join(missing)}")
+
+    @classmethod
+    def get_http_session(cls):
+        return get_session(cls.INTEGRATION_NAME.value)
+
     @classmethod
     def handle_oauth_callback(cls, request):
         pass
 
+    @classmethod
+    def parse_rate_limit_headers(cls, headers):
+        """
+        Returns the RateLimitWindows described by a response's headers.
+        """
+        return []
+
+    def get_rate_limit_bucket(self):
+        return self.INTEGRATION_NAME.value
+
+    def request(self, method, url, **kwargs):
+        """
+        Makes an API call for this user, spending from the provider's rate
+        limit budget at the current priority. Raises RateLimitExceeded instead
+        of calling out when that budget is used up.
+        """
+        bucket = self.get_rate_limit_bucket()
+        rate_limiter.acquire(bucket)
+        res = self.get_http_session().request(method, url, **kwargs)
+        retry_after = res.headers.get("Retry-After", "")
+        rate_limiter.update(
+            bucket,
+            self.parse_rate_limit_headers(res.headers),
+            status_code=res.status_code,
+            retry_after=int(retry_after) if retry_after.isdigit() else None,
+        )
+        return res
+
+    def download_activity_file(self, url, headers):
+        """
+        Streams the response body into an ActivityFile in chunks, without
+        decoding it.
+        """
+        with self.request("GET", url, headers=headers, stream=True) as res:
+            res.raise_for_status()
+            return ActivityFile.from_response(res)
+
+    def upload_activity_file(
+        self, url, headers, data, activity_file, filename, content_type
+    ):
+        """
+        Posts `activity_file` as a multipart upload with the `data` form fields.
+        An ActivityFile is streamed from its spool while the request is sent.
+        """
+        fileobj, size = open_activity_file(activity_file)
+        body = MultipartStream(data, "file", filename, fileobj, size, content_type)
+        headers = {**headers, "Content-Type": body.content_type}
+        return self.request("POST", url, headers=headers, data=body)
+
+    def get_activity_track(self, activity_id):
+        """
+        Downloads an activity's file and parses its trackpoints into a Track.
+        """
+        activity_file, _ = self.get_activity_file(activity_id)
+        with activity_file:
+            return read_track(activity_file)
+
+    @classmethod
+    @abc.abstractmethod
+    def verify_webhook(cls, request):
+        """
+        Answers the provider's subscription verification challenge. Raises
+        ValueError if the challenge does not match our configuration.
+        """
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def handle_webhook_event(cls, request):
+        """
+        Parses a webhook event and returns the UserIntegrations with new
+        activities to poll.
+        """
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def get_external_id(cls, token_response):
+        """
+        Returns the provider account id from an OAuth token response.
+        """
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def get_activity_ref(cls, activity):
+        pass
+
+    @classmethod
+    def is_own_upload(cls, activity):
+        return False
+
+    @classmethod
+    @abc.abstractmethod
+    def normalize_activity(cls, activity):
+        """
+        Returns the provider-neutral summary of an activity from the activity
+        list: its activity_ref, activity_type, start_time, duration in seconds
+        and distance in metres.
+        """
+        pass
+
     @classmethod
     def exchange_code_for_token(cls, code):
         try:
@@ -36,7 +199,7 @@ class BaseIntegration:
                 "grant_type": "authorization_code",
                 "code": code,
             }
-            res = requests.post(cls.TOKEN_URL, data=data, headers=headers)
+            res = cls.get_http_session().post(cls.TOKEN_URL, data=data, headers=headers)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -58,7 +221,7 @@ class BaseIntegration:
                 "grant_type": "refresh_token",
                 "refresh_token": refresh_token,
             }
-            res = requests.post(cls.TOKEN_URL, data=data, headers=headers)
+            res = cls.get_http_session().post(cls.TOKEN_URL, data=data, headers=headers)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -86,26 +249,98 @@ class BaseIntegration:
             raise e
 
     def get_access_token(self):
-        if self.user_integration.is_token_expired:
-            try:
-                res = self.exchange_refresh_token_for_token(
-                    self.user_integration.refresh_token
-                )
-                access_token, refresh_token, expires_in = (
-                    res.get("access_token"),
-                    res.get("refresh_token"),
-                    res.get("expires_in"),
-                )
-                self.user_integration.access_token = access_token
-                self.user_integration.refresh_token = refresh_token
-                self.user_integration.expires_at = timezone.now() + timedelta(
-                    seconds=expires_in
-                )
-                self.user_integration.save(
-                    update_fields=["access_token", "refresh_token", "expires_at"]
+        if self.user_integration.needs_token_refresh:
+            self.refresh_access_token()
+
+        return self.user_integration.access_token
+
+    def refresh_access_token(self, margin=None):
+        """
+        Refreshes the access token if it expires within `margin` seconds.
+
+        The refresh runs under a row lock on the UserIntegration, so concurrent
+        callers in any worker share one refresh. Callers that waited on the lock
+        re-read the row and reuse the new token. They do not refresh again with
+        a refresh token that the provider has already rotated.
+        """
+        if margin is None:
+            margin = settings.INTEGRATION_TOKEN_REFRESH_MARGIN
+
+        try:
+            with transaction.atomic():
+                user_integration = UserIntegration.objects.select_for_update().get(
+                    pk=self.user_integration.pk
                 )
-            except Exception as e:
-                logger.error("error_getting_access_token", error=e)
-                raise e
+                if user_integration.token_expires_within(margin):
+                    res = self.exchange_refresh_token_for_token(
+                        user_integration.refresh_token
+                    )
+                    access_token, refresh_token, expires_in = (
+                        res.get("access_token"),
+                        res.get("refresh_token"),
+                        res.get("expires_in"),
+                    )
+                    user_integration.access_token = access_token
+                    user_integration.refresh_token = (
+                        refresh_token or user_integration.refresh_token
+                    )
+                    user_integration.expires_at = timezone.now() + timedelta(
+                        seconds=expires_in
+                    )
+                    user_integration.save(
+                        update_fields=["access_token", "refresh_token", "expires_at"]
+                    )
+                else:
+                    logger.info(
+                        "access_token_already_refreshed",
+                        user_integration_id=user_integration.pk,
+                    )
+        except Exception as e:
+            logger.error("error_getting_access_token", error=e)
+            raise e
 
+        self.user_integration.access_token = user_integration.access_token
+        self.user_integration.refresh_token = user_integration.refresh_token
+        self.user_integration.expires_at = user_integration.expires_at
         return self.user_integration.access_token
+
+    @abc.abstractmethod
+    def iter_activities(self, since=None):
+        pass
+
+    @single_flight
+    def fetch_activities(self, since=None):
+        return list(self.iter_activities(since))
+
+    def poll_activities(self):
+        """
+        Yields the activities added since the previous poll, using
+        UserIntegration.last_synced_at as the cursor. The cursor only advances
+        once every page has been consumed, so an interrupted poll is retried
+        from the same point.
+
+        The first poll starts from when the integration was connected, so the
+        activities the user already had are not synced.
+        """
+        polled_at = timezone.now()
+        since = (
+            self.user_integration.last_synced_at or self.user_integration.created
+        ) - timedelta(seconds=settings.INTEGRATION_POLL_CURSOR_OVERLAP)
+
+        yield from self.iter_activities(since)
+
+        self.user_integration.last_synced_at = polled_at
+        self.user_integration.save(update_fields=["last_synced_at"])
+
+    async def arun_single_flight(self, method, *args, **kwargs):
+        """
+        Runs a single_flight method on an io thread. A call already in flight
+        is awaited here instead, so waiting does not hold up an io thread.
+        """
+        future = flights.in_flight(flight_key(self, method.__name__, args, kwargs))
+        if future:
+            return await asyncio.wrap_future(future)
+        return await run_in_io_thread(method, *args, **kwargs)
+
+    async def afetch_activities(self, *args, **kwargs):
+        return await self.arun_single_flight(self.fetch_activities, *args, **kwargs)
@@ -1,17 +1,21 @@
 import base64
 import hashlib
+import hmac
+import json
+import time
 import uuid
-from datetime import timedelta
+from datetime import datetime, timedelta
 from urllib.parse import urlencode
 
-import requests
 import structlog
 from django.conf import settings
 from django.utils import timezone
 
 from integrations.app_integrations import BaseIntegration
-from integrations.constants import IntegrationName, UserIntegrationStatus
+from integrations.constants import ActivityType, IntegrationName, UserIntegrationStatus
 from integrations.models import UserIntegration
+from integrations.ratelimit import RateLimitWindow
+from integrations.singleflight import single_flight
 from users.models import User
 
 logger = structlog.get_logger(__name__)
@@ -21,6 +25,20 @@ class FitbitIntegration(BaseIntegration):
     INTEGRATION_NAME = IntegrationName.Fitbit
     TOKEN_URL = "https://api.fitbit.com/oauth2/token"
     AUTHORIZE_URL = "https://www.fitbit.com/oauth2/authorize"
+    ACTIVITIES_PAGE_SIZE = 100
+    # metres per unit of the activity list's distanceUnit
+    DISTANCE_UNITS = {"Kilometer": 1000, "Mile": 1609.344, "Meter": 1}
+    ACTIVITY_TYPES = {
+        "Run": ActivityType.RUN,
+        "Treadmill": ActivityType.RUN,
+        "Bike": ActivityType.RIDE,
+        "Outdoor Bike": ActivityType.RIDE,
+        "Walk": ActivityType.WALK,
+        "Hike": ActivityType.HIKE,
+        "Swim": ActivityType.SWIM,
+    }
+    WEBHOOK_EVENT_STATUS = 204
+    PER_USER_WEBHOOK_SUBSCRIPTIONS = True
 
     CLIENT_ID = settings.FITBIT_CLIENT_ID
     CLIENT_SECRET = settings.FITBIT_CLIENT_SECRET
@@ -28,6 +46,7 @@ class FitbitIntegration(BaseIntegration):
     """
     Fitbit API Reference:
     https://dev.fitbit.com/build/reference/web-api/developer-guide/authorization/
+    https://dev.fitbit.com/build/reference/web-api/developer-guide/using-subscriptions/
     """
 
     def __init__(self, user_integration):
@@ -67,6 +86,7 @@ class FitbitIntegration(BaseIntegration):
             user_integration.refresh_token = refresh_token
             user_integration.expires_at = timezone.now() + timedelta(seconds=expires_in)
             user_integration.status = UserIntegrationStatus.COMPLETED.value
+            user_integration.external_id = self.get_external_id(res)
             user_integration.metadata = res
             user_integration.save(
                 update_fields=[
@@ -74,6 +94,7 @@ class FitbitIntegration(BaseIntegration):
                     "refresh_token",
                     "expires_at",
                     "status",
+                    "external_id",
                     "metadata",
                 ]
             )
@@ -84,6 +105,149 @@ class FitbitIntegration(BaseIntegration):
             user_integration.save(update_fields=["status", "metadata"])
             raise e
 
+        try:
+            self(user_integration).create_webhook_subscription()
+        except Exception as e:
+            logger.error(
+                "error_subscribing_to_webhooks",
+                user_integration_id=user_integration.id,
+                error=e,
+            )
+            # syncer.services imports the integrations, so it is imported here.
+            # Without a subscription, a poll picks up the activities added
+            # since the integration was connected.
+            from syncer.services import enqueue_poll_job
+
+            enqueue_poll_job(user_integration)
+
+    @classmethod
+    def verify_webhook(cls, request):
+        if request.GET.get("verify") != settings.FITBIT_WEBHOOK_VERIFICATION_CODE:
+            raise ValueError("Invalid verification code")
+        return None
+
+    @classmethod
+    def handle_webhook_event(cls, request):
+        body = request.body
+        expected_signature = base64.b64encode(
+            hmac.new(f"{cls.CLIENT_SECRET}&".encode(), body, hashlib.sha1).digest()
+        ).decode()
+        signature = request.headers.get("X-Fitbit-Signature", "")
+        if not hmac.compare_digest(signature, expected_signature):
+            raise ValueError("Invalid signature")
+
+        owner_ids = {
+            notification.get("ownerId")
+            for notification in json.loads(body)
+            if notification.get("collectionType") == "activities"
+        }
+        logger.info("fitbit_webhook_event", owner_ids=list(owner_ids))
+        if not owner_ids:
+            return []
+
+        return list(
+            UserIntegration.objects.filter(
+                integration_name=cls.INTEGRATION_NAME.value,
+                status=UserIntegrationStatus.COMPLETED.value,
+                external_id__in=owner_ids,
+            )
+        )
+
+    def get_webhook_subscription_headers(self):
+        headers = {"Authorization": f"Bearer {self.get_access_token()}"}
+        if settings.FITBIT_WEBHOOK_SUBSCRIBER_ID:
+            headers["X-Fitbit-Subscriber-Id"] = settings.FITBIT_WEBHOOK_SUBSCRIBER_ID
+        return headers
+
+    def create_webhook_subscription(self):
+        try:
+            url = (
+                "https://api.fitbit.com/1/user/-/activities/apiSubscriptions/"
+                f"{self.user_integration.id}.json"
+            )
+            res = self.request(
+                "POST", url, headers=self.get_webhook_subscription_headers()
+            )
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            logger.error("error_creating_webhook_subscription", error=e)
+            raise e
+
+    def list_webhook_subscriptions(self):
+        try:
+            url = "https://api.fitbit.com/1/user/-/activities/apiSubscriptions.json"
+            res = self.request(
+                "GET", url, headers=self.get_webhook_subscription_headers()
+            )
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            logger.error("error_listing_webhook_subscriptions", error=e)
+            raise e
+
+    def delete_webhook_subscription(self, subscription_id=None):
+        try:
+            subscription_id = subscription_id or self.user_integration.id
+            url = (
+                "https://api.fitbit.com/1/user/-/activities/apiSubscriptions/"
+                f"{subscription_id}.json"
+            )
+            res = self.request(
+                "DELETE", url, headers=self.get_webhook_subscription_headers()
+            )
+            res.raise_for_status()
+        except Exception as e:
+            logger.error("error_deleting_webhook_subscription", error=e)
+            raise e
+
+    @classmethod
+    def get_external_id(cls, token_response):
+        return token_response.get("user_id")
+
+    @classmethod
+    def get_activity_ref(cls, activity):
+        return activity["logId"]
+
+    @classmethod
+    def normalize_activity(cls, activity):
+        distance = activity.get("distance")
+        if distance is not None:
+            distance *= cls.DISTANCE_UNITS[activity.get("distanceUnit", "Kilometer")]
+        duration = activity.get("duration")
+        return {
+            "activity_ref": str(cls.get_activity_ref(activity)),
+            "activity_type": cls.ACTIVITY_TYPES.get(
+                activity.get("activityName"), ActivityType.OTHER
+            ).value,
+            "start_time": datetime.fromisoformat(activity["startTime"]),
+            # milliseconds
+            "duration": duration / 1000 if duration is not None else None,
+            "distance": distance,
+        }
+
+    @classmethod
+    def is_own_upload(cls, activity):
+        return (activity.get("source") or {}).get("id") == cls.CLIENT_ID
+
+    @classmethod
+    def parse_rate_limit_headers(cls, headers):
+        limit = headers.get("Fitbit-Rate-Limit-Limit")
+        remaining = headers.get("Fitbit-Rate-Limit-Remaining")
+        reset = headers.get("Fitbit-Rate-Limit-Reset")
+        if not limit or not remaining or not reset:
+            return []
+
+        return [
+            RateLimitWindow(
+                int(limit), int(limit) - int(remaining), time.time() + int(reset)
+            )
+        ]
+
+    def get_rate_limit_bucket(self):
+        # Fitbit quotas are per user rather than per application
+        return f"{self.INTEGRATION_NAME.value}:{self.user_integration.id}"
+
     @classmethod
     def exchange_code_for_token(cls, code, *args, **kwargs):
         try:
@@ -100,7 +264,7 @@ class FitbitIntegration(BaseIntegration):
                 "code": code,
                 "code_verifier": kwargs.get("code_verifier"),
             }
-            res = requests.post(cls.TOKEN_URL, data=data, headers=headers)
+            res = cls.get_http_session().post(cls.TOKEN_URL, data=data, headers=headers)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -139,20 +303,26 @@ class FitbitIntegration(BaseIntegration):
             logger.error("error_getting_authorization_url", error=e)
             raise e
 
-    def fetch_activities(self, since=None):
+    def iter_activities(self, since=None):
         try:
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             url = "https://api.fitbit.com/1/user/-/activities/list.json"
             since = since or timezone.now() - timedelta(days=7)
+            # afterDate requires ascending sort; pagination.next carries the
+            # query for the following page
             params = {
                 "afterDate": since.strftime("%Y-%m-%d"),
-                "sort": "desc",
+                "sort": "asc",
                 "offset": 0,
-                "limit": 20,
+                "limit": self.ACTIVITIES_PAGE_SIZE,
             }
-            res = requests.get(url, headers=headers, params=params)
-            res.raise_for_status()
-            return self.filter_activities(res.json().get("activities", []))
+            while url:
+                res = self.request("GET", url, headers=headers, params=params)
+                res.raise_for_status()
+                data = res.json()
+                yield from self.filter_activities(data.get("activities", []))
+                url = data.get("pagination", {}).get("next")
+                params = None
         except Exception as e:
             logger.error("error_fetching_activities", error=e)
             raise e
@@ -169,11 +339,12 @@ class FitbitIntegration(BaseIntegration):
             logger.error("error_filtering_activities", error=e)
             raise e
 
+    @single_flight
     def get_activity_details(self, log_id):
         try:
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             url = f"https://api.fitbit.com/1/user/-/activities/{log_id}.json"
-            res = requests.get(url, headers=headers)
+            res = self.request("GET", url, headers=headers)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -185,9 +356,8 @@ class FitbitIntegration(BaseIntegration):
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             user_id = self.user_integration.metadata.get("user_id")
             url = f"https://api.fitbit.com/1/user/{user_id}/activities/{log_id}.tcx"
-            res = requests.get(url, headers=headers)
-            res.raise_for_status()
-            return res.text, res.headers.get("Content-Type")
+            activity_file = self.download_activity_file(url, headers)
+            return activity_file, activity_file.content_type
         except Exception as e:
             logger.error("error_getting_activity_file", error=e)
             raise e
@@ -198,19 +368,12 @@ class FitbitIntegration(BaseIntegration):
         try:
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             url = "https://api.fitbit.com/1/user/-/activities"
-            files = {
-                "file": (
-                    "activity.tcx",
-                    activity_file.encode("utf-8")
-                    if isinstance(activity_file, str)
-                    else activity_file,
-                    "application/xml",
-                )
-            }
             data = {
                 "data_type": "tcx",
             }
-            res = requests.post(url, headers=headers, files=files, data=data)
+            res = self.upload_activity_file(
+                url, headers, data, activity_file, "activity.tcx", "application/xml"
+            )
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -1,17 +1,21 @@
 import base64
 import hashlib
+import json
 import uuid
-from datetime import timedelta
+from datetime import datetime, timedelta
 from urllib.parse import urlencode
 
-import requests
 import structlog
 from django.conf import settings
 from django.utils import timezone
 
 from integrations.app_integrations import BaseIntegration
-from integrations.constants import IntegrationName, UserIntegrationStatus
+from integrations.constants import ActivityType, IntegrationName, UserIntegrationStatus
+from integrations.fit import FIT_CONTENT_TYPE
 from integrations.models import UserIntegration
+from integrations.ratelimit import RateLimitWindow
+from integrations.singleflight import single_flight
+from integrations.streams import gzip_activity_file
 from users.models import User
 
 logger = structlog.get_logger(__name__)
@@ -21,6 +25,24 @@ class StravaIntegration(BaseIntegration):
     INTEGRATION_NAME = IntegrationName.Strava
     TOKEN_URL = "https://www.strava.com/oauth/token"
     AUTHORIZE_URL = "https://www.strava.com/oauth/authorize"
+    WEBHOOK_SUBSCRIPTIONS_URL = "https://www.strava.com/api/v3/push_subscriptions"
+    ACTIVITIES_PAGE_SIZE = 200
+    UPLOAD_EXTERNAL_ID_PREFIX = "runsync-"
+    UPLOAD_FORMATS = ("fit", "tcx")
+    UPLOAD_CONTENT_TYPES = {"fit": FIT_CONTENT_TYPE, "tcx": "application/xml"}
+    ACTIVITY_TYPES = {
+        "Run": ActivityType.RUN,
+        "TrailRun": ActivityType.RUN,
+        "VirtualRun": ActivityType.RUN,
+        "Ride": ActivityType.RIDE,
+        "MountainBikeRide": ActivityType.RIDE,
+        "GravelRide": ActivityType.RIDE,
+        "EBikeRide": ActivityType.RIDE,
+        "VirtualRide": ActivityType.RIDE,
+        "Walk": ActivityType.WALK,
+        "Hike": ActivityType.HIKE,
+        "Swim": ActivityType.SWIM,
+    }
 
     CLIENT_ID = settings.STRAVA_CLIENT_ID
     CLIENT_SECRET = settings.STRAVA_CLIENT_SECRET
@@ -29,6 +51,7 @@ class StravaIntegration(BaseIntegration):
     Strava API Reference:
     https://developers.strava.com/docs/authentication/
     https://developers.strava.com/docs/reference/
+    https://developers.strava.com/docs/webhooks/
     """
 
     def __init__(self, user_integration):
@@ -45,7 +68,9 @@ class StravaIntegration(BaseIntegration):
             raise ValueError("No state provided")
         user_integration = (
             UserIntegration.objects.filter(
-                integration_name=cls.INTEGRATION_NAME.value, state=state
+                integration_name=cls.INTEGRATION_NAME.value,
+                state=state,
+                status=UserIntegrationStatus.PENDING.value,
             )
             .order_by("-created")
             .first()
@@ -65,6 +90,7 @@ class StravaIntegration(BaseIntegration):
             user_integration.refresh_token = refresh_token
             user_integration.expires_at = timezone.now() + timedelta(seconds=expires_in)
             user_integration.status = UserIntegrationStatus.COMPLETED.value
+            user_integration.external_id = cls.get_external_id(res)
             user_integration.metadata = res
             user_integration.save(
                 update_fields=[
@@ -72,6 +98,7 @@ class StravaIntegration(BaseIntegration):
                     "refresh_token",
                     "expires_at",
                     "status",
+                    "external_id",
                     "metadata",
                 ]
             )
@@ -79,6 +106,132 @@ class StravaIntegration(BaseIntegration):
             logger.error("error_handling_oauth_callback", error=e)
             raise e
 
+    @classmethod
+    def verify_webhook(cls, request):
+        if request.GET.get("hub.mode") != "subscribe":
+            raise ValueError("Invalid hub mode")
+        if request.GET.get("hub.verify_token") != settings.STRAVA_WEBHOOK_VERIFY_TOKEN:
+            raise ValueError("Invalid verify token")
+        return {"hub.challenge": request.GET.get("hub.challenge")}
+
+    @classmethod
+    def handle_webhook_event(cls, request):
+        event = json.loads(request.body)
+        subscription_id = settings.STRAVA_WEBHOOK_SUBSCRIPTION_ID
+        if subscription_id and str(event.get("subscription_id")) != subscription_id:
+            raise ValueError("Unknown subscription")
+
+        logger.info(
+            "strava_webhook_event",
+            object_type=event.get("object_type"),
+            aspect_type=event.get("aspect_type"),
+            owner_id=event.get("owner_id"),
+        )
+        if (
+            event.get("object_type") != "activity"
+            or event.get("aspect_type") != "create"
+        ):
+            return []
+
+        return list(
+            UserIntegration.objects.filter(
+                integration_name=cls.INTEGRATION_NAME.value,
+                status=UserIntegrationStatus.COMPLETED.value,
+                external_id=str(event.get("owner_id")),
+            )
+        )
+
+    @classmethod
+    def create_webhook_subscription(cls):
+        try:
+            data = {
+                "client_id": cls.CLIENT_ID,
+                "client_secret": cls.CLIENT_SECRET,
+                "callback_url": settings.STRAVA_WEBHOOK_CALLBACK_URL,
+                "verify_token": settings.STRAVA_WEBHOOK_VERIFY_TOKEN,
+            }
+            res = cls.get_http_session().post(cls.WEBHOOK_SUBSCRIPTIONS_URL, data=data)
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            logger.error("error_creating_webhook_subscription", error=e)
+            raise e
+
+    @classmethod
+    def list_webhook_subscriptions(cls):
+        try:
+            params = {"client_id": cls.CLIENT_ID, "client_secret": cls.CLIENT_SECRET}
+            res = cls.get_http_session().get(
+                cls.WEBHOOK_SUBSCRIPTIONS_URL, params=params
+            )
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            logger.error("error_listing_webhook_subscriptions", error=e)
+            raise e
+
+    @classmethod
+    def delete_webhook_subscription(cls, subscription_id):
+        try:
+            params = {"client_id": cls.CLIENT_ID, "client_secret": cls.CLIENT_SECRET}
+            res = cls.get_http_session().delete(
+                f"{cls.WEBHOOK_SUBSCRIPTIONS_URL}/{subscription_id}", params=params
+            )
+            res.raise_for_status()
+        except Exception as e:
+            logger.error("error_deleting_webhook_subscription", error=e)
+            raise e
+
+    @classmethod
+    def get_external_id(cls, token_response):
+        athlete_id = (token_response.get("athlete") or {}).get("id")
+        return str(athlete_id) if athlete_id else None
+
+    @classmethod
+    def get_activity_ref(cls, activity):
+        return activity["id"]
+
+    @classmethod
+    def normalize_activity(cls, activity):
+        return {
+            "activity_ref": str(cls.get_activity_ref(activity)),
+            "activity_type": cls.ACTIVITY_TYPES.get(
+                activity.get("sport_type") or activity.get("type"),
+                ActivityType.OTHER,
+            ).value,
+            "start_time": datetime.fromisoformat(activity["start_date"]),
+            "duration": activity.get("elapsed_time"),
+            "distance": activity.get("distance"),
+        }
+
+    @classmethod
+    def is_own_upload(cls, activity):
+        return (activity.get("external_id") or "").startswith(
+            cls.UPLOAD_EXTERNAL_ID_PREFIX
+        )
+
+    @classmethod
+    def parse_rate_limit_headers(cls, headers):
+        # "X-RateLimit-Limit: 100,1000" is the 15 minute and the daily limit;
+        # the windows reset on the quarter hour and at midnight UTC
+        limits = headers.get("X-RateLimit-Limit")
+        usages = headers.get("X-RateLimit-Usage")
+        if not limits or not usages:
+            return []
+
+        now = timezone.now()
+        resets = (
+            now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0)
+            + timedelta(minutes=15),
+            now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1),
+        )
+        return [
+            RateLimitWindow(int(limit), int(usage), reset_at.timestamp())
+            for limit, usage, reset_at in zip(
+                limits.split(","), usages.split(","), resets
+            )
+        ]
+
     @classmethod
     def exchange_code_for_token(cls, code):
         try:
@@ -88,7 +241,7 @@ class StravaIntegration(BaseIntegration):
                 "code": code,
                 "grant_type": "authorization_code",
             }
-            res = requests.post(cls.TOKEN_URL, params=data)
+            res = cls.get_http_session().post(cls.TOKEN_URL, params=data)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -104,7 +257,7 @@ class StravaIntegration(BaseIntegration):
                 "grant_type": "refresh_token",
                 "refresh_token": refresh_token,
             }
-            res = requests.post(cls.TOKEN_URL, params=data)
+            res = cls.get_http_session().post(cls.TOKEN_URL, params=data)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -139,18 +292,25 @@ class StravaIntegration(BaseIntegration):
             logger.error("error_getting_authorization_url", error=e)
             raise e
 
-    def fetch_activities(self, since=None):
+    def iter_activities(self, since=None):
         try:
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             since = since or timezone.now() - timedelta(days=25)
-            params = {
-                "after": int(since.timestamp()),
-                "per_page": 30,
-            }
             url = "https://www.strava.com/api/v3/athlete/activities"
-            res = requests.get(url, headers=headers, params=params)
-            res.raise_for_status()
-            return self.filter_activities(res.json())
+            page = 1
+            while True:
+                params = {
+                    "after": int(since.timestamp()),
+                    "page": page,
+                    "per_page": self.ACTIVITIES_PAGE_SIZE,
+                }
+                res = self.request("GET", url, headers=headers, params=params)
+                res.raise_for_status()
+                activities = res.json()
+                yield from self.filter_activities(activities)
+                if len(activities) < self.ACTIVITIES_PAGE_SIZE:
+                    return
+                page += 1
         except Exception as e:
             logger.error("error_fetching_activities", error=e)
             raise e
@@ -158,11 +318,12 @@ class StravaIntegration(BaseIntegration):
     def filter_activities(self, activities):
         return [activity for activity in activities if activity.get("distance", 0) > 0]
 
+    @single_flight
     def get_activity_details(self, activity_id):
         try:
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             url = f"https://www.strava.com/api/v3/activities/{activity_id}"
-            res = requests.get(url, headers=headers)
+            res = self.request("GET", url, headers=headers)
             res.raise_for_status()
             return res.json()
         except Exception as e:
@@ -176,9 +337,8 @@ class StravaIntegration(BaseIntegration):
                 "Accept": "application/gpx+xml",
             }
             url = f"https://www.strava.com/api/v3/activities/{activity_id}/export_tcx"
-            res = requests.get(url, headers=headers)
-            res.raise_for_status()
-            return res.text, res.headers.get("Content-Type")
+            activity_file = self.download_activity_file(url, headers)
+            return activity_file, activity_file.content_type
         except Exception as e:
             logger.error("error_getting_activity_file", error=e)
             raise e
@@ -186,24 +346,33 @@ class StravaIntegration(BaseIntegration):
     def upload_activity(
         self, activity_file, file_metadata=None, activity_metadata=None
     ):
+        compressed_file = None
         try:
             headers = {"Authorization": f"Bearer {self.get_access_token()}"}
             url = "https://www.strava.com/api/v3/uploads"
-            files = {
-                "file": (
-                    "activity.tcx",
-                    activity_file.encode("utf-8")
-                    if isinstance(activity_file, str)
-                    else activity_file,
-                    "application/xml",
+            data_type = (file_metadata or {}).get("data_type", "tcx")
+            filename = f"activity.{data_type}"
+            content_type = self.UPLOAD_CONTENT_TYPES[data_type]
+            if settings.STRAVA_UPLOAD_GZIP:
+                compressed_file = activity_file = gzip_activity_file(activity_file)
+                data_type, filename, content_type = (
+                    f"{data_type}.gz",
+                    f"{filename}.gz",
+                    compressed_file.content_type,
                 )
-            }
             data = {
-                "data_type": "tcx",
+                "data_type": data_type,
+                # lets polls recognise activities we created
+                "external_id": f"{self.UPLOAD_EXTERNAL_ID_PREFIX}{uuid.uuid4().hex}",
             }
-            res = requests.post(url, headers=headers, files=files, data=data)
+            res = self.upload_activity_file(
+                url, headers, data, activity_file, filename, content_type
+            )
             res.raise_for_status()
             return res.json()
         except Exception as e:
             logger.error("error_uploading_activity", error=e)
             raise e
+        finally:
+            if compressed_file is not None:
+                compressed_file.close()
@@ -2,9 +2,12 @@ import structlog
 from django.conf import settings
 from django.shortcuts import redirect
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from integrations.cache import activity_list_cache
 from integrations.services import get_integration
+from syncer.services import enqueue_poll_job
 
 logger = structlog.get_logger(__name__)
 
@@ -33,3 +36,41 @@ class IntegrationOauthCallbackView(APIView):
         except Exception as err:
             logger.error("error_handling_oauth_callback", error=err)
             return redirect(settings.INTEGRATION_CALLBACK_REDIRECT_URL_ERROR)
+
+
+class IntegrationWebhookView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, integration_name):
+        integration = get_integration(integration_name)
+        if not integration:
+            return Response(status=404)
+
+        try:
+            challenge = integration.verify_webhook(request)
+        except Exception as err:
+            logger.error("error_verifying_webhook", error=err)
+            return Response(status=404)
+
+        if challenge is None:
+            return Response(status=204)
+        return Response(challenge)
+
+    def post(self, request, integration_name):
+        integration = get_integration(integration_name)
+        if not integration:
+            return Response(status=404)
+
+        try:
+            user_integrations = integration.handle_webhook_event(request)
+        except Exception as err:
+            logger.error("error_handling_webhook_event", error=err)
+            return Response(status=404)
+
+        for user_integration in user_integrations:
+            activity_list_cache.invalidate(
+                user_integration.user_id, user_integration.integration_name
+            )
+            enqueue_poll_job(user_integration)
+        return Response(status=integration.WEBHOOK_EVENT_STATUS)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path(
+        "<str:integration_name>/",
+        views.IntegrationWebhookView.as_view(),
+        name="integration-webhook",
+    ),
+]
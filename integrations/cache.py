@@ -0,0 +1,123 @@
+import time
+
+import structlog
+from django.conf import settings
+from django.core.cache import cache
+
+from integrations.app_integrations import run_in_io_thread, submit_to_io_thread
+from integrations.constants import RateLimitPriority, UserIntegrationStatus
+from integrations.models import UserIntegration
+from integrations.ratelimit import rate_limit_priority
+from integrations.serializers import UserIntegrationListSerializer
+from integrations.services import index_activities
+
+logger = structlog.get_logger(__name__)
+
+
+class ActivityListCache:
+    """
+    Caches each user's activity list per provider in the shared cache.
+
+    A list younger than INTEGRATION_ACTIVITY_CACHE_TTL is served as is. An
+    older one is served for up to INTEGRATION_ACTIVITY_CACHE_STALE_TTL more
+    seconds while it is refreshed in the background. Only a missing list is
+    fetched while the request waits.
+    """
+
+    def cache_key(self, user_id, integration_name):
+        return f"integrations:activities:{user_id}:{integration_name}"
+
+    def refresh_lock_key(self, user_id, integration_name):
+        return f"integrations:activities:refresh:{user_id}:{integration_name}"
+
+    def fetch(self, integration):
+        """
+        Fetches the activity list from the provider, indexes it and caches it.
+        """
+        return self.store(integration, integration.fetch_activities())
+
+    def store(self, integration, activities):
+        user_integration = integration.user_integration
+        index_activities(user_integration, activities)
+        cache.set(
+            self.cache_key(user_integration.user_id, user_integration.integration_name),
+            {"activities": activities, "fetched_at": time.time()},
+            timeout=settings.INTEGRATION_ACTIVITY_CACHE_TTL
+            + settings.INTEGRATION_ACTIVITY_CACHE_STALE_TTL,
+        )
+        return activities
+
+    def refresh(self, integration):
+        try:
+            with rate_limit_priority(RateLimitPriority.BACKGROUND):
+                self.fetch(integration)
+        except Exception as e:
+            logger.error(
+                "error_refreshing_activity_list",
+                user_integration_id=integration.user_integration.id,
+                error=e,
+            )
+
+    async def aget_activities(self, integration):
+        user_integration = integration.user_integration
+        entry = await cache.aget(
+            self.cache_key(user_integration.user_id, user_integration.integration_name)
+        )
+        if entry is None:
+            # concurrent misses for the same list await one fetch without
+            # holding an io thread each
+            activities = await integration.afetch_activities()
+            return await run_in_io_thread(self.store, integration, activities)
+
+        if time.time() - entry["fetched_at"] >= settings.INTEGRATION_ACTIVITY_CACHE_TTL:
+            # one refresh per list at a time, and at most one per TTL if it
+            # keeps failing
+            if await cache.aadd(
+                self.refresh_lock_key(
+                    user_integration.user_id, user_integration.integration_name
+                ),
+                True,
+                timeout=settings.INTEGRATION_ACTIVITY_CACHE_TTL,
+            ):
+                submit_to_io_thread(self.refresh, integration)
+        return entry["activities"]
+
+    def invalidate(self, user_id, integration_name):
+        cache.delete(self.cache_key(user_id, integration_name))
+
+
+activity_list_cache = ActivityListCache()
+
+
+class ConnectionStateCache:
+    """
+    Caches the integrations each user has connected, already serialized, so
+    the apps and connected integrations endpoints usually make no query.
+    Entries are cleared when a user integration changes status or is deleted.
+    """
+
+    def cache_key(self, user_id):
+        return f"integrations:connected:{user_id}"
+
+    def get_connected(self, user_id):
+        key = self.cache_key(user_id)
+        connected = cache.get(key)
+        if connected is None:
+            user_integrations = (
+                UserIntegration.objects.filter(
+                    user_id=user_id, status=UserIntegrationStatus.COMPLETED.value
+                )
+                .order_by("-created")
+                .only(*UserIntegrationListSerializer.Meta.fields)
+            )
+            connected = list(
+                UserIntegrationListSerializer(user_integrations, many=True).data
+            )
+            cache.set(key, connected, timeout=settings.INTEGRATION_CONNECTION_CACHE_TTL)
+        return connected
+
+    def invalidate(self, user_id):
+        cache.delete(self.cache_key(user_id))
+
+
+connection_state_cache = ConnectionStateCache()
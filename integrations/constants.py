@@ -18,3 +18,22 @@ class UserIntegrationStatus(Enum):
     @classmethod
     def choices(cls):
         return [(choice.value, choice.name) for choice in cls]
+
+
+class RateLimitPriority(Enum):
+    INTERACTIVE = "interactive"
+    SYNC = "sync"
+    BACKGROUND = "background"
+
+
+class ActivityType(Enum):
+    RUN = "run"
+    RIDE = "ride"
+    WALK = "walk"
+    HIKE = "hike"
+    SWIM = "swim"
+    OTHER = "other"
+
+    @classmethod
+    def choices(cls):
+        return [(choice.value, choice.name) for choice in cls]
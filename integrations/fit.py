@@ -0,0 +1,319 @@
+import struct
+import time
+
+import numpy as np
+from django.conf import settings
+
+from integrations.streams import ActivityFile
+from integrations.tracks import read_track
+
+# FIT protocol reference:
+# https://developer.garmin.com/fit/protocol/
+# https://developer.garmin.com/fit/file-types/activity/
+
+FIT_CONTENT_TYPE = "application/vnd.ant.fit"
+
+# seconds between the unix epoch and the FIT epoch, 1989-12-31T00:00:00Z
+FIT_EPOCH = 631065600
+SEMICIRCLES_PER_DEGREE = 2**31 / 180
+PROTOCOL_VERSION = 0x20
+PROFILE_VERSION = 2132
+
+# base types as (id, struct format, invalid value)
+ENUM = (0x00, "B", 0xFF)
+UINT8 = (0x02, "B", 0xFF)
+UINT16 = (0x84, "H", 0xFFFF)
+SINT32 = (0x85, "i", 0x7FFFFFFF)
+UINT32 = (0x86, "I", 0xFFFFFFFF)
+UINT32Z = (0x8C, "I", 0x00000000)
+
+# global message numbers
+FILE_ID = 0
+SESSION = 18
+LAP = 19
+RECORD = 20
+EVENT = 21
+ACTIVITY = 34
+
+SPORTS = {"running": 1, "cycling": 2}
+MANUFACTURER_DEVELOPMENT = 255
+FILE_TYPE_ACTIVITY = 4
+EVENT_TIMER, EVENT_SESSION, EVENT_LAP, EVENT_ACTIVITY = 0, 8, 9, 26
+EVENT_TYPE_START, EVENT_TYPE_STOP, EVENT_TYPE_STOP_ALL = 0, 1, 4
+
+# record fields as (field number, base type, track column, scale, offset)
+RECORD_FIELDS = (
+    (0, SINT32, "latitudes", SEMICIRCLES_PER_DEGREE, 0),
+    (1, SINT32, "longitudes", SEMICIRCLES_PER_DEGREE, 0),
+    (2, UINT16, "altitudes", 5, 500),
+    (5, UINT32, "distances", 100, 0),
+    (3, UINT8, "heart_rates", 1, 0),
+    (4, UINT8, "cadences", 1, 0),
+)
+
+_CRC_TABLE = (
+    0x0000,
+    0xCC01,
+    0xD801,
+    0x1400,
+    0xF001,
+    0x3C00,
+    0x2800,
+    0xE401,
+    0xA001,
+    0x6C00,
+    0x7800,
+    0xB401,
+    0x5000,
+    0x9C01,
+    0x8801,
+    0x4400,
+)
+
+
+def crc16(data, crc=0):
+    for byte in data:
+        tmp = _CRC_TABLE[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ _CRC_TABLE[byte & 0xF]
+        tmp = _CRC_TABLE[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ _CRC_TABLE[(byte >> 4) & 0xF]
+    return crc
+
+
+def _fit_time(timestamp):
+    return int(timestamp) - FIT_EPOCH
+
+
+def _missing(values):
+    # float track columns mark missing values with NaN, integer ones with 0
+    return np.isnan(values) if values.dtype.kind == "f" else values == 0
+
+
+def _field_values(values, base_type, scale, offset):
+    """
+    Scales a track column to the values of a record field. Missing values, and
+    values outside the range of the field's base type, are written as the
+    field's invalid value instead of wrapping around.
+    """
+    limits = np.iinfo(np.dtype(base_type[1]))
+    scaled = np.round((values.astype(np.float64) + offset) * scale)
+    invalid = (
+        _missing(values)
+        | (scaled < limits.min)
+        | (scaled > limits.max)
+        | (scaled == base_type[2])
+    )
+    return np.where(invalid, base_type[2], scaled)
+
+
+class Message:
+    """
+    A FIT message layout: its definition message, and the struct used to pack
+    its data messages.
+    """
+
+    def __init__(self, local_type, global_number, fields):
+        self.local_type = local_type
+        self.struct = struct.Struct(
+            "<B" + "".join(base_type[1] for _, base_type in fields)
+        )
+        self.definition = struct.pack(
+            "<BBBHB", 0x40 | local_type, 0, 0, global_number, len(fields)
+        ) + b"".join(
+            struct.pack("<BBB", number, struct.calcsize(base_type[1]), base_type[0])
+            for number, base_type in fields
+        )
+
+    @property
+    def size(self):
+        return self.struct.size
+
+    def pack(self, *values):
+        return self.struct.pack(self.local_type, *values)
+
+
+class FitWriter:
+    """
+    Writes a FIT activity file to an ActivityFile, computing the CRC as it
+    goes. The data size in the header must be given up front, since the
+    output is never rewound.
+    """
+
+    def __init__(self, data_size):
+        self.activity_file = ActivityFile(content_type=FIT_CONTENT_TYPE)
+        self.crc = 0
+        header = struct.pack(
+            "<BBHI4s", 14, PROTOCOL_VERSION, PROFILE_VERSION, data_size, b".FIT"
+        )
+        self.write(header + struct.pack("<H", crc16(header)))
+
+    def write(self, data):
+        self.crc = crc16(data, self.crc)
+        self.activity_file.write(data)
+
+    def close(self):
+        self.activity_file.write(struct.pack("<H", self.crc))
+        return self.activity_file
+
+
+def encode_fit(track):
+    """
+    Encodes a Track as a FIT activity file with one session and one lap.
+
+    Records only carry the fields that the track has values for. They are
+    packed from the track's columns into a preallocated NumPy record buffer a
+    chunk at a time, and each chunk is flushed to the output.
+    """
+    if not len(track):
+        raise ValueError("Track has no trackpoints")
+
+    columns = track.to_numpy()
+    record_fields = [
+        field for field in RECORD_FIELDS if not _missing(columns[field[2]]).all()
+    ]
+    file_id = Message(
+        0,
+        FILE_ID,
+        ((0, ENUM), (1, UINT16), (2, UINT16), (3, UINT32Z), (4, UINT32)),
+    )
+    event = Message(1, EVENT, ((253, UINT32), (0, ENUM), (1, ENUM)))
+    record = Message(
+        2,
+        RECORD,
+        (
+            (253, UINT32),
+            *((number, base_type) for number, base_type, *_ in record_fields),
+        ),
+    )
+    lap = Message(
+        3,
+        LAP,
+        (
+            (253, UINT32),
+            (2, UINT32),
+            (7, UINT32),
+            (8, UINT32),
+            (9, UINT32),
+            (0, ENUM),
+            (1, ENUM),
+        ),
+    )
+    session = Message(
+        4,
+        SESSION,
+        (
+            (253, UINT32),
+            (2, UINT32),
+            (7, UINT32),
+            (8, UINT32),
+            (9, UINT32),
+            (5, ENUM),
+            (25, UINT16),
+            (26, UINT16),
+            (0, ENUM),
+            (1, ENUM),
+        ),
+    )
+    activity = Message(
+        5,
+        ACTIVITY,
+        ((253, UINT32), (0, UINT32), (1, UINT16), (2, ENUM), (3, ENUM), (4, ENUM)),
+    )
+    record_dtype = np.dtype(
+        [
+            ("header", "u1"),
+            ("timestamp", "<u4"),
+            *(
+                (column, f"<{base_type[1]}")
+                for _, base_type, column, *_ in record_fields
+            ),
+        ]
+    )
+    messages = (file_id, event, record, lap, session, activity)
+    data_size = (
+        sum(len(message.definition) for message in messages)
+        + file_id.size
+        + 2 * event.size
+        + len(track) * record.size
+        + lap.size
+        + session.size
+        + activity.size
+    )
+
+    start_time = _fit_time(track.timestamps[0])
+    end_time = _fit_time(track.timestamps[-1])
+    elapsed_time = (end_time - start_time) * 1000
+    total_distance = round(track.distance * 100)
+    sport = SPORTS.get(track.sport, 0)
+
+    writer = FitWriter(data_size)
+    writer.write(file_id.definition)
+    writer.write(
+        file_id.pack(
+            FILE_TYPE_ACTIVITY,
+            MANUFACTURER_DEVELOPMENT,
+            0,
+            int(time.time()),
+            _fit_time(time.time()),
+        )
+    )
+    writer.write(event.definition)
+    writer.write(event.pack(start_time, EVENT_TIMER, EVENT_TYPE_START))
+
+    writer.write(record.definition)
+    chunk_records = max(settings.ACTIVITY_FILE_CHUNK_SIZE // record.size, 1)
+    buffer = np.empty(chunk_records, dtype=record_dtype)
+    buffer["header"] = record.local_type
+    for chunk_start in range(0, len(track), chunk_records):
+        chunk_end = min(chunk_start + chunk_records, len(track))
+        chunk = buffer[: chunk_end - chunk_start]
+        chunk["timestamp"] = (
+            columns["timestamps"][chunk_start:chunk_end].astype(np.int64) - FIT_EPOCH
+        )
+        for _, base_type, column, scale, offset in record_fields:
+            values = columns[column][chunk_start:chunk_end]
+            chunk[column] = _field_values(values, base_type, scale, offset)
+        writer.write(chunk.tobytes())
+
+    writer.write(event.pack(end_time, EVENT_TIMER, EVENT_TYPE_STOP_ALL))
+    writer.write(lap.definition)
+    writer.write(
+        lap.pack(
+            end_time,
+            start_time,
+            elapsed_time,
+            elapsed_time,
+            total_distance,
+            EVENT_LAP,
+            EVENT_TYPE_STOP,
+        )
+    )
+    writer.write(session.definition)
+    writer.write(
+        session.pack(
+            end_time,
+            start_time,
+            elapsed_time,
+            elapsed_time,
+            total_distance,
+            sport,
+            0,
+            1,
+            EVENT_SESSION,
+            EVENT_TYPE_STOP,
+        )
+    )
+    writer.write(activity.definition)
+    writer.write(
+        activity.pack(end_time, elapsed_time, 1, 0, EVENT_ACTIVITY, EVENT_TYPE_STOP)
+    )
+    return writer.close()
+
+
+def convert_to_fit(activity_file):
+    """
+    Converts a TCX or GPX ActivityFile to a FIT ActivityFile.
+    """
+    return encode_fit(read_track(activity_file))
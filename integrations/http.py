@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import structlog
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = structlog.get_logger(__name__)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_io_executor = None
+_io_executor_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default (connect, read) timeout to every request
+    that does not set one explicitly, so a slow upstream cannot hold a worker.
+    """
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def build_session():
+    retries = Retry(
+        total=settings.INTEGRATION_HTTP_MAX_RETRIES,
+        connect=settings.INTEGRATION_HTTP_MAX_RETRIES,
+        read=False,
+        status=False,
+        backoff_factor=0.3,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=settings.INTEGRATION_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.INTEGRATION_HTTP_POOL_MAXSIZE,
+        pool_block=settings.INTEGRATION_HTTP_POOL_BLOCK,
+        max_retries=retries,
+        timeout=(
+            settings.INTEGRATION_HTTP_CONNECT_TIMEOUT,
+            settings.INTEGRATION_HTTP_READ_TIMEOUT,
+        ),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(integration_name):
+    """
+    Returns the process-wide keep-alive session for an integration, creating it
+    on first use. Connections to the provider are pooled and reused across
+    requests and threads.
+    """
+    session = _sessions.get(integration_name)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(integration_name)
+        if session is None:
+            logger.info("creating_http_session", integration_name=integration_name)
+            session = build_session()
+            _sessions[integration_name] = session
+    return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_io_executor():
+    """
+    Returns the dedicated thread pool async integration calls are dispatched to.
+    It is sized independently of the default event loop executor so that one
+    ASGI worker can keep many blocking provider calls in flight at once.
+    """
+    global _io_executor
+    if _io_executor is not None:
+        return _io_executor
+
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=settings.INTEGRATION_ASYNC_MAX_WORKERS,
+                thread_name_prefix="integration-io",
+            )
+    return _io_executor
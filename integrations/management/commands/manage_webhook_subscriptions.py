@@ -0,0 +1,51 @@
+import structlog
+from django.core.management.base import BaseCommand, CommandError
+
+from integrations.constants import UserIntegrationStatus
+from integrations.models import UserIntegration
+from integrations.services import get_integration
+
+logger = structlog.get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Creates, lists or deletes provider webhook subscriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("integration_name")
+        parser.add_argument("action", choices=["create", "list", "delete"])
+        parser.add_argument("--subscription-id")
+
+    def handle(self, *args, **options):
+        integration = get_integration(options["integration_name"])
+        if not integration:
+            raise CommandError("Invalid integration name")
+
+        if not integration.PER_USER_WEBHOOK_SUBSCRIPTIONS:
+            self.run(integration, options)
+            return
+
+        user_integrations = UserIntegration.objects.filter(
+            integration_name=options["integration_name"],
+            status=UserIntegrationStatus.COMPLETED.value,
+        )
+        for user_integration in user_integrations:
+            try:
+                self.run(integration(user_integration), options)
+            except Exception as e:
+                logger.error(
+                    "error_managing_webhook_subscription",
+                    user_integration_id=user_integration.id,
+                    error=e,
+                )
+
+    def run(self, integration, options):
+        action = options["action"]
+        if action == "create":
+            self.stdout.write(str(integration.create_webhook_subscription()))
+        elif action == "list":
+            self.stdout.write(str(integration.list_webhook_subscriptions()))
+        elif options["subscription_id"] or integration.PER_USER_WEBHOOK_SUBSCRIPTIONS:
+            integration.delete_webhook_subscription(options["subscription_id"])
+        else:
+            raise CommandError("--subscription-id is required")
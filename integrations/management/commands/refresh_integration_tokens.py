@@ -0,0 +1,54 @@
+import time
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from integrations.services import refresh_expiring_tokens
+
+logger = structlog.get_logger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Refreshes provider access tokens that are about to expire"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lookahead",
+            type=int,
+            default=settings.INTEGRATION_TOKEN_SWEEP_LOOKAHEAD,
+            help="Refresh tokens expiring within this many seconds",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.INTEGRATION_TOKEN_SWEEP_BATCH_SIZE,
+        )
+        parser.add_argument(
+            "--batch-interval",
+            type=float,
+            default=settings.INTEGRATION_TOKEN_SWEEP_BATCH_INTERVAL,
+            help="Seconds to wait between batches",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep sweeping every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.INTEGRATION_TOKEN_SWEEP_INTERVAL,
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed, failed = refresh_expiring_tokens(
+                lookahead=options["lookahead"],
+                batch_size=options["batch_size"],
+                batch_interval=options["batch_interval"],
+            )
+            logger.info("refreshed_expiring_tokens", refreshed=refreshed, failed=failed)
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
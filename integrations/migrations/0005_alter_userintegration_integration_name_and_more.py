@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0004_auto_20250517_0610"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userintegration",
+            name="integration_name",
+            field=models.CharField(
+                choices=[("fitbit", "Fitbit"), ("strava", "Strava")],
+                db_index=True,
+                max_length=255,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userintegration",
+            name="metadata",
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+
+
+def backfill_external_id(apps, schema_editor):
+    UserIntegration = apps.get_model("integrations", "UserIntegration")
+    UserIntegration.objects.filter(integration_name="strava").update(
+        external_id=KeyTextTransform("id", KeyTransform("athlete", "metadata"))
+    )
+    UserIntegration.objects.filter(integration_name="fitbit").update(
+        external_id=KeyTextTransform("user_id", "metadata")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0005_alter_userintegration_integration_name_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userintegration",
+            name="external_id",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="userintegration",
+            index=models.Index(
+                fields=["integration_name", "external_id"],
+                name="integrations_external_id_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_external_id, migrations.RunPython.noop),
+    ]
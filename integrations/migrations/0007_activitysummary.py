@@ -0,0 +1,83 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:32
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0006_userintegration_external_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivitySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    django_extensions.db.fields.ModificationDateTimeField(
+                        auto_now=True, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "integration_name",
+                    models.CharField(
+                        choices=[("fitbit", "Fitbit"), ("strava", "Strava")],
+                        max_length=255,
+                    ),
+                ),
+                ("activity_ref", models.CharField(max_length=255)),
+                ("start_time", models.DateTimeField()),
+                ("duration", models.FloatField(blank=True, null=True)),
+                ("distance", models.FloatField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user_integration",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="integrations.userintegration",
+                    ),
+                ),
+            ],
+            options={
+                "get_latest_by": "modified",
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["user", "integration_name", "start_time"],
+                        name="activity_summary_start_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user_integration", "activity_ref"),
+                        name="activity_summary_ref_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0007_activitysummary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="activitysummary",
+            name="activity_type",
+            field=models.CharField(
+                choices=[
+                    ("run", "RUN"),
+                    ("ride", "RIDE"),
+                    ("walk", "WALK"),
+                    ("hike", "HIKE"),
+                    ("swim", "SWIM"),
+                    ("other", "OTHER"),
+                ],
+                default="other",
+                max_length=255,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activitysummary",
+            index=models.Index(
+                fields=["user", "start_time", "id"], name="activity_summary_user_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="activitysummary",
+            index=models.Index(
+                fields=["user", "activity_type", "start_time", "id"],
+                name="activity_summary_type_idx",
+            ),
+        ),
+    ]
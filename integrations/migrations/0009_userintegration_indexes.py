@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0008_activitysummary_activity_type"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userintegration",
+            index=models.Index(
+                condition=models.Q(("status", "completed")),
+                fields=["user", "integration_name", "-created"],
+                name="integrations_completed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userintegration",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["integration_name", "state", "-created"],
+                name="integrations_pending_state_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userintegration",
+            index=models.Index(
+                condition=models.Q(("status", "completed")),
+                fields=["expires_at"],
+                name="integrations_token_expiry_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+def dedupe_activity_summaries(apps, schema_editor):
+    ActivitySummary = apps.get_model("integrations", "ActivitySummary")
+    # a reconnected provider indexed its activities again under the new
+    # UserIntegration, which is the copy kept
+    seen = set()
+    duplicates = []
+    for summary in ActivitySummary.objects.order_by(
+        "user_id", "integration_name", "activity_ref", "-user_integration_id", "-id"
+    ).values("id", "user_id", "integration_name", "activity_ref"):
+        key = (summary["user_id"], summary["integration_name"], summary["activity_ref"])
+        if key in seen:
+            duplicates.append(summary["id"])
+        else:
+            seen.add(key)
+    for start in range(0, len(duplicates), 1000):
+        ActivitySummary.objects.filter(id__in=duplicates[start : start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0010_ratelimitbudget"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="activitysummary",
+            name="activity_summary_ref_uniq",
+        ),
+        migrations.RunPython(dedupe_activity_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="activitysummary",
+            constraint=models.UniqueConstraint(
+                fields=("user", "integration_name", "activity_ref"),
+                name="activity_summary_ref_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:10
+
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # budgets are rebuilt from the rate limit headers of the next responses,
+    # so the old rows are dropped rather than converted
+    dependencies = [
+        ("integrations", "0011_activitysummary_user_ref_uniq"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="RateLimitBudget",
+        ),
+        migrations.CreateModel(
+            name="RateLimitBudget",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    django_extensions.db.fields.ModificationDateTimeField(
+                        auto_now=True, verbose_name="modified"
+                    ),
+                ),
+                ("bucket", models.CharField(max_length=255)),
+                ("window", models.PositiveSmallIntegerField()),
+                ("limit", models.PositiveIntegerField()),
+                ("usage", models.PositiveIntegerField()),
+                ("reset_at", models.FloatField()),
+            ],
+            options={
+                "get_latest_by": "modified",
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("bucket", "window"),
+                        name="ratelimit_budget_window_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
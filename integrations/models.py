@@ -1,8 +1,11 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django_extensions.db.models import TimeStampedModel
 
-from integrations.constants import IntegrationName, UserIntegrationStatus
+from integrations.constants import ActivityType, IntegrationName, UserIntegrationStatus
 from users.models import User
 
 
@@ -22,11 +25,165 @@ class UserIntegration(TimeStampedModel):
     refresh_token = models.CharField(max_length=2048, null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     last_synced_at = models.DateTimeField(null=True, blank=True)
+    # provider-side account id, e.g. the Strava athlete id or Fitbit user id
+    external_id = models.CharField(max_length=255, null=True, blank=True)
     metadata = models.JSONField(default=dict)
 
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["integration_name", "external_id"],
+                name="integrations_external_id_idx",
+            ),
+            # a user's latest connected integration, per provider or for all
+            models.Index(
+                fields=["user", "integration_name", "-created"],
+                name="integrations_completed_idx",
+                condition=models.Q(status=UserIntegrationStatus.COMPLETED.value),
+            ),
+            # the pending integration an OAuth callback completes
+            models.Index(
+                fields=["integration_name", "state", "-created"],
+                name="integrations_pending_state_idx",
+                condition=models.Q(status=UserIntegrationStatus.PENDING.value),
+            ),
+            # connected integrations whose access token is about to expire
+            models.Index(
+                fields=["expires_at"],
+                name="integrations_token_expiry_idx",
+                condition=models.Q(status=UserIntegrationStatus.COMPLETED.value),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.integration_name}"
 
     @property
     def is_token_expired(self):
         return self.expires_at and self.expires_at < timezone.now()
+
+    @property
+    def needs_token_refresh(self):
+        return self.token_expires_within(settings.INTEGRATION_TOKEN_REFRESH_MARGIN)
+
+    def token_expires_within(self, seconds):
+        return self.expires_at and self.expires_at < timezone.now() + timedelta(
+            seconds=seconds
+        )
+
+
+class ActivitySummaryQuerySet(models.QuerySet):
+    def find_duplicate(self, user_id, integration_name, start_time, duration, distance):
+        """
+        Returns an activity the user has on `integration_name` that matches the
+        given one: it starts within SYNC_DUPLICATE_START_TOLERANCE seconds, and
+        its duration and distance agree within the relative tolerances.
+
+        Candidates are found with a range scan of the start time index, so
+        only activities close in time are compared.
+        """
+        start_tolerance = timedelta(seconds=settings.SYNC_DUPLICATE_START_TOLERANCE)
+        candidates = self.filter(
+            user_id=user_id,
+            integration_name=integration_name,
+            start_time__range=(
+                start_time - start_tolerance,
+                start_time + start_tolerance,
+            ),
+        )
+        for candidate in candidates:
+            if _within(
+                candidate.duration, duration, settings.SYNC_DUPLICATE_DURATION_TOLERANCE
+            ) and _within(
+                candidate.distance, distance, settings.SYNC_DUPLICATE_DISTANCE_TOLERANCE
+            ):
+                return candidate
+        return None
+
+
+def _within(value, other, tolerance):
+    # a value the provider did not report cannot rule a match out
+    if value is None or other is None:
+        return True
+    return abs(value - other) <= tolerance * max(value, other)
+
+
+class ActivitySummary(TimeStampedModel):
+    """
+    An activity seen on a provider, as reported by its activity list. Syncs
+    check it to skip activities the target already has, and activity lists
+    are served from it.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user_integration = models.ForeignKey(UserIntegration, on_delete=models.CASCADE)
+    integration_name = models.CharField(
+        max_length=255, choices=IntegrationName.choices()
+    )
+    activity_ref = models.CharField(max_length=255)
+    activity_type = models.CharField(
+        max_length=255,
+        choices=ActivityType.choices(),
+        default=ActivityType.OTHER.value,
+    )
+    start_time = models.DateTimeField()
+    # seconds
+    duration = models.FloatField(null=True, blank=True)
+    # metres
+    distance = models.FloatField(null=True, blank=True)
+
+    objects = ActivitySummaryQuerySet.as_manager()
+
+    class Meta(TimeStampedModel.Meta):
+        constraints = [
+            # a reconnected provider lists the same activities under a new
+            # UserIntegration
+            models.UniqueConstraint(
+                fields=["user", "integration_name", "activity_ref"],
+                name="activity_summary_ref_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "integration_name", "start_time"],
+                name="activity_summary_start_idx",
+            ),
+            # keyset pagination orders by (start_time, id)
+            models.Index(
+                fields=["user", "start_time", "id"],
+                name="activity_summary_user_idx",
+            ),
+            models.Index(
+                fields=["user", "activity_type", "start_time", "id"],
+                name="activity_summary_type_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.integration_name} - {self.activity_ref}"
+
+
+class RateLimitBudget(TimeStampedModel):
+    """
+    One window of a provider rate limit bucket: its limit, usage and reset
+    time. Calls are counted with a conditional UPDATE, so workers never wait
+    on each other's reads.
+    """
+
+    bucket = models.CharField(max_length=255)
+    # position of the window in the provider's rate limit headers
+    window = models.PositiveSmallIntegerField()
+    limit = models.PositiveIntegerField()
+    usage = models.PositiveIntegerField()
+    # unix time
+    reset_at = models.FloatField()
+
+    class Meta(TimeStampedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket", "window"], name="ratelimit_budget_window_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket} - {self.window}"
@@ -0,0 +1,128 @@
+import contextlib
+import contextvars
+import time
+
+import structlog
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from integrations.constants import RateLimitPriority
+from integrations.models import RateLimitBudget
+
+logger = structlog.get_logger(__name__)
+
+_priority = contextvars.ContextVar(
+    "rate_limit_priority", default=RateLimitPriority.INTERACTIVE
+)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, bucket, retry_after):
+        super().__init__(f"Rate limit budget for {bucket} exhausted")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+@contextlib.contextmanager
+def rate_limit_priority(priority):
+    """
+    Runs the enclosed provider calls at `priority`. Lower priorities may only
+    spend part of each budget, which keeps the rest for interactive requests.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def get_priority():
+    return _priority.get()
+
+
+class RateLimitWindow:
+    def __init__(self, limit, usage, reset_at):
+        self.limit = limit
+        self.usage = usage
+        self.reset_at = reset_at
+
+    def to_dict(self):
+        return {"limit": self.limit, "usage": self.usage, "reset_at": self.reset_at}
+
+
+class RateLimiter:
+    """
+    Tracks the request budget of each provider bucket in RateLimitBudget rows,
+    one per rate limit window.
+
+    Budgets are set from the rate limit headers of every response and counted
+    down locally in between, so all workers see roughly the same picture. A
+    call may go ahead while usage in every window of its bucket is below the
+    share of the limit allowed for its priority.
+
+    A call is counted with one conditional UPDATE of its bucket's live
+    windows, so concurrent workers are all counted without taking a lock to
+    read the budget first.
+    """
+
+    def acquire(self, bucket, priority=None):
+        priority = priority or get_priority()
+        share = settings.INTEGRATION_RATE_LIMIT_SHARES[priority.value]
+
+        windows = RateLimitBudget.objects.filter(
+            bucket=bucket, reset_at__gt=time.time()
+        )
+        window_count = windows.count()
+        if not window_count:
+            return
+
+        with transaction.atomic():
+            counted = windows.filter(usage__lt=F("limit") * share).update(
+                usage=F("usage") + 1, modified=timezone.now()
+            )
+            if counted == window_count:
+                return
+            # a window without room for the call undoes the others' counts
+            transaction.set_rollback(True)
+
+        window = (
+            windows.filter(usage__gte=F("limit") * share).order_by("window").first()
+        )
+        if window is None:
+            # the budget was reset by a response in the meantime
+            return
+        retry_after = max(window.reset_at - time.time(), 1)
+        logger.warning(
+            "rate_limit_budget_exhausted",
+            bucket=bucket,
+            priority=priority.value,
+            usage=window.usage,
+            limit=window.limit,
+            retry_after=retry_after,
+        )
+        raise RateLimitExceeded(bucket, retry_after)
+
+    def update(self, bucket, windows, status_code=None, retry_after=None):
+        if status_code == 429:
+            # the provider says we are out, whatever our counts say
+            for window in windows:
+                window.usage = max(window.usage, window.limit)
+            if not windows:
+                windows = [RateLimitWindow(1, 1, time.time() + (retry_after or 60))]
+        if not windows:
+            return
+
+        RateLimitBudget.objects.bulk_create(
+            [
+                RateLimitBudget(bucket=bucket, window=index, **window.to_dict())
+                for index, window in enumerate(windows)
+            ],
+            update_conflicts=True,
+            unique_fields=["bucket", "window"],
+            update_fields=["limit", "usage", "reset_at", "modified"],
+        )
+
+
+rate_limiter = RateLimiter()
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from integrations.models import UserIntegration
+from integrations.models import ActivitySummary, UserIntegration
 
 
 class UserIntegrationListSerializer(serializers.ModelSerializer):
@@ -15,3 +15,17 @@ class AppSerializer(serializers.Serializer):
     connect_url = serializers.URLField()
     activities_url = serializers.URLField()
     status = serializers.CharField()
+
+
+class ActivitySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivitySummary
+        fields = [
+            "id",
+            "integration_name",
+            "activity_ref",
+            "activity_type",
+            "start_time",
+            "duration",
+            "distance",
+        ]
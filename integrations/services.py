@@ -1,5 +1,15 @@
+import time
+from datetime import timedelta
+
+import structlog
+from django.utils import timezone
+
 from integrations.app_integrations.fitbit import FitbitIntegration
 from integrations.app_integrations.strava import StravaIntegration
+from integrations.constants import UserIntegrationStatus
+from integrations.models import ActivitySummary, UserIntegration
+
+logger = structlog.get_logger(__name__)
 
 
 def get_integration(integration_type):
@@ -9,3 +19,84 @@ def get_integration(integration_type):
         return StravaIntegration
     else:
         return None
+
+
+def refresh_expiring_tokens(lookahead, batch_size, batch_interval):
+    """
+    Refreshes the access tokens of completed integrations expiring within
+    `lookahead` seconds, `batch_size` at a time with `batch_interval` seconds
+    between batches to stay within the providers' token endpoint limits.
+    Returns the number of refreshed and failed integrations.
+    """
+    user_integration_ids = list(
+        UserIntegration.objects.filter(
+            status=UserIntegrationStatus.COMPLETED.value,
+            refresh_token__isnull=False,
+            expires_at__lt=timezone.now() + timedelta(seconds=lookahead),
+        )
+        .order_by("expires_at")
+        .values_list("id", flat=True)
+    )
+
+    refreshed, failed = 0, 0
+    for offset in range(0, len(user_integration_ids), batch_size):
+        if offset:
+            time.sleep(batch_interval)
+
+        batch = UserIntegration.objects.filter(
+            id__in=user_integration_ids[offset : offset + batch_size]
+        )
+        for user_integration in batch:
+            try:
+                integration = get_integration(user_integration.integration_name)
+                integration(user_integration).refresh_access_token(margin=lookahead)
+                refreshed += 1
+            except Exception as e:
+                logger.error(
+                    "error_refreshing_expiring_token",
+                    user_integration_id=user_integration.id,
+                    error=e,
+                )
+                failed += 1
+
+    return refreshed, failed
+
+
+def index_activities(user_integration, activities):
+    """
+    Records activities from the integration's activity list in the
+    ActivitySummary index, updating the ones seen before.
+    """
+    integration = get_integration(user_integration.integration_name)
+    summaries = {}
+    for activity in activities:
+        try:
+            summary = integration.normalize_activity(activity)
+        except Exception as e:
+            logger.warning(
+                "error_normalizing_activity",
+                user_integration_id=user_integration.id,
+                error=e,
+            )
+            continue
+        # overlapping polls can list an activity twice
+        summaries[summary["activity_ref"]] = ActivitySummary(
+            user_id=user_integration.user_id,
+            user_integration=user_integration,
+            integration_name=user_integration.integration_name,
+            **summary,
+        )
+
+    return ActivitySummary.objects.bulk_create(
+        summaries.values(),
+        update_conflicts=True,
+        unique_fields=["user", "integration_name", "activity_ref"],
+        update_fields=[
+            "user_integration",
+            "activity_type",
+            "start_time",
+            "duration",
+            "distance",
+            "modified",
+        ],
+    )
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from integrations.cache import connection_state_cache
+from integrations.models import UserIntegration
+
+
+@receiver(post_save, sender=UserIntegration)
+def invalidate_connection_state(sender, instance, update_fields=None, **kwargs):
+    # token refreshes and sync bookkeeping do not change what is connected
+    if update_fields is not None and "status" not in update_fields:
+        return
+    connection_state_cache.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=UserIntegration)
+def invalidate_disconnected(sender, instance, **kwargs):
+    connection_state_cache.invalidate(instance.user_id)
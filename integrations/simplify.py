@@ -0,0 +1,140 @@
+import numpy as np
+import structlog
+
+from integrations.tracks import EARTH_RADIUS
+
+logger = structlog.get_logger(__name__)
+
+# times the tolerances are halved to bring a simplified track within the
+# error bounds before giving up and keeping the original
+SIMPLIFY_ATTEMPTS = 4
+
+
+def downsample_by_time(timestamps, interval):
+    """
+    Returns the indices of the first point in each `interval` seconds of the
+    track, and of its last point.
+    """
+    if interval <= 0 or len(timestamps) < 3:
+        return np.arange(len(timestamps))
+
+    buckets = np.floor((timestamps - timestamps[0]) / interval)
+    keep = np.empty(len(timestamps), dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[1:-1] = buckets[1:-1] != buckets[:-2]
+    return np.flatnonzero(keep)
+
+
+def douglas_peucker(latitudes, longitudes, timestamps, tolerance, max_gap=0):
+    """
+    Returns the indices of the points kept by Douglas-Peucker simplification,
+    so that no dropped point lies more than `tolerance` metres from the
+    simplified line. Segments longer than `max_gap` seconds are split as well,
+    so the kept points stay at most that far apart in time.
+
+    Points are projected onto a local plane, and the distances from each
+    segment are computed for all of its points at once.
+    """
+    n = len(latitudes)
+    if n < 3:
+        return np.arange(n)
+
+    latitude_origin = np.radians(np.mean(latitudes))
+    x = EARTH_RADIUS * np.radians(longitudes) * np.cos(latitude_origin)
+    y = EARTH_RADIUS * np.radians(latitudes)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, n - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1 : end] - x[start], y[start + 1 : end] - y[start]
+        length = dx * dx + dy * dy
+        # distance to the segment rather than the line through it, so that
+        # out-and-back sections are not dropped
+        projection = np.clip(
+            (px * dx + py * dy) / length if length else np.zeros_like(px), 0, 1
+        )
+        distances = np.hypot(px - projection * dx, py - projection * dy)
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+        elif max_gap and timestamps[end] - timestamps[start] > max_gap:
+            split = (start + end) // 2
+        else:
+            continue
+
+        keep[split] = True
+        segments.append((start, split))
+        segments.append((split, end))
+
+    return np.flatnonzero(keep)
+
+
+def simplify_indices(track, tolerance, interval, max_gap):
+    columns = track.to_numpy()
+    indices = downsample_by_time(columns["timestamps"], interval)
+
+    latitudes = columns["latitudes"][indices]
+    longitudes = columns["longitudes"][indices]
+    located = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    if tolerance <= 0 or located.sum() < 3:
+        return indices
+
+    # points without a position can only be thinned out by time
+    kept = douglas_peucker(
+        latitudes[located],
+        longitudes[located],
+        columns["timestamps"][indices][located],
+        tolerance,
+        max_gap,
+    )
+    return np.union1d(indices[~located], indices[located][kept])
+
+
+def simplify_track(
+    track,
+    tolerance,
+    interval=0,
+    max_gap=0,
+    max_distance_error=0.005,
+    max_duration_error=1,
+):
+    """
+    Simplifies a Track with Douglas-Peucker at `tolerance` metres, after
+    keeping at most one point per `interval` seconds.
+
+    The length of the simplified GPS trace must stay within
+    `max_distance_error`, relative to the original, and its elapsed time
+    within `max_duration_error` seconds. Otherwise the tolerances are halved
+    and it is tried again. The original track is returned if no attempt is
+    within the bounds. Recorded distances are not compared, since the last
+    one is always kept.
+    """
+    distance, duration = track.path_length, track.duration
+    for _ in range(SIMPLIFY_ATTEMPTS):
+        simplified = track.take(simplify_indices(track, tolerance, interval, max_gap))
+        distance_error = (
+            abs(simplified.path_length - distance) / distance if distance else 0
+        )
+        duration_error = abs(simplified.duration - duration)
+        if (
+            distance_error <= max_distance_error
+            and duration_error <= max_duration_error
+        ):
+            logger.info(
+                "simplified_track",
+                points=len(track),
+                simplified_points=len(simplified),
+                distance_error=distance_error,
+            )
+            return simplified
+        tolerance, interval = tolerance / 2, interval / 2
+
+    logger.info("track_simplification_out_of_bounds", points=len(track))
+    return track
@@ -0,0 +1,76 @@
+import functools
+import threading
+from concurrent.futures import Future
+
+
+def flight_key(integration, method_name, args, kwargs):
+    return (
+        integration.user_integration.id,
+        method_name,
+        args,
+        tuple(sorted(kwargs.items())),
+    )
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key within the process. The
+    first caller runs the call. Callers that arrive while it is in flight wait
+    for it and get its result, or its exception, instead of calling again.
+
+    Waiting callers share the result object, so they must not mutate it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key):
+        """
+        Returns the Future of the call in flight for `key`, if any. Async
+        callers can await it with asyncio.wrap_future without holding a thread.
+        """
+        with self._lock:
+            return self._calls.get(key)
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        # later callers start a new call rather than reuse this result
+        with self._lock:
+            del self._calls[key]
+
+
+flights = SingleFlight()
+
+
+def single_flight(method):
+    """
+    Coalesces concurrent calls of an integration method for the same user
+    integration and arguments.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = flight_key(self, method.__name__, args, kwargs)
+        return flights.do(key, method, self, *args, **kwargs)
+
+    return wrapper
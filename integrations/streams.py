@@ -0,0 +1,152 @@
+import io
+import threading
+import uuid
+import zlib
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+
+
+class ActivityFile:
+    """
+    An activity file held as bytes in a spooled temporary file. It stays in
+    memory up to ACTIVITY_FILE_SPOOL_MAX_SIZE and rolls over to disk beyond
+    that, so a long activity does not grow the worker's memory.
+
+    Each open() returns an independent reader. Several uploads can then stream
+    the same file at once.
+    """
+
+    def __init__(self, content_type=None):
+        self.content_type = content_type
+        self.size = 0
+        self._spool = SpooledTemporaryFile(
+            max_size=settings.ACTIVITY_FILE_SPOOL_MAX_SIZE
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_response(cls, res):
+        activity_file = cls(content_type=res.headers.get("Content-Type"))
+        try:
+            for chunk in res.iter_content(chunk_size=settings.ACTIVITY_FILE_CHUNK_SIZE):
+                activity_file.write(chunk)
+        except Exception:
+            # a download cut off part way through would otherwise leave its
+            # spool, possibly rolled over to disk, behind
+            activity_file.close()
+            raise
+        return activity_file
+
+    def write(self, chunk):
+        with self._lock:
+            self._spool.seek(0, io.SEEK_END)
+            self._spool.write(chunk)
+            self.size += len(chunk)
+
+    def open(self):
+        return ActivityFileReader(self)
+
+    def read_at(self, offset, size):
+        with self._lock:
+            self._spool.seek(offset)
+            return self._spool.read(size)
+
+    def close(self):
+        self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_activity_file(activity_file):
+    """
+    Returns a reader over an ActivityFile, str or bytes, and its size in bytes.
+    """
+    if isinstance(activity_file, ActivityFile):
+        return activity_file.open(), activity_file.size
+    if isinstance(activity_file, str):
+        activity_file = activity_file.encode("utf-8")
+    return io.BytesIO(activity_file), len(activity_file)
+
+
+def gzip_activity_file(activity_file):
+    """
+    Gzips an activity file into a new ActivityFile one chunk at a time, so
+    neither the original nor the compressed copy has to fit in memory.
+    """
+    reader, _ = open_activity_file(activity_file)
+    # wbits=16+MAX_WBITS writes a gzip header and trailer rather than raw zlib
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    compressed = ActivityFile(content_type="application/gzip")
+    while chunk := reader.read(settings.ACTIVITY_FILE_CHUNK_SIZE):
+        compressed.write(compressor.compress(chunk))
+    compressed.write(compressor.flush())
+    return compressed
+
+
+class ActivityFileReader(io.RawIOBase):
+    def __init__(self, activity_file):
+        self.activity_file = activity_file
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.activity_file.read_at(self.offset, len(buffer))
+        buffer[: len(data)] = data
+        self.offset += len(data)
+        return len(data)
+
+
+class MultipartStream:
+    """
+    A multipart/form-data request body whose file part is read from a stream
+    while it is sent, rather than built in memory first. Its length is known
+    up front, so requests sends it with a Content-Length header.
+    """
+
+    def __init__(self, fields, name, filename, fileobj, size, content_type):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        head = b"".join(
+            (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+            for key, value in fields.items()
+        )
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        self._parts = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+        self._length = len(head) + size + len(tail)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while chunk := self.read(settings.ACTIVITY_FILE_CHUNK_SIZE):
+            yield chunk
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
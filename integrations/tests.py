@@ -0,0 +1,304 @@
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Q
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, set_script_prefix
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from integrations.app_integrations.fitbit import FitbitIntegration
+from integrations.app_integrations.strava import StravaIntegration
+from integrations.constants import IntegrationName, UserIntegrationStatus
+from integrations.fit import UINT8, UINT16, _field_values, encode_fit
+from integrations.models import ActivitySummary, UserIntegration
+from integrations.tracks import Track
+from users.models import User
+
+# the indexes the hot UserIntegration queries rely on, as (name, fields,
+# condition)
+USER_INTEGRATION_INDEXES = (
+    (
+        "integrations_completed_idx",
+        ["user", "integration_name", "-created"],
+        Q(status=UserIntegrationStatus.COMPLETED.value),
+    ),
+    (
+        "integrations_pending_state_idx",
+        ["integration_name", "state", "-created"],
+        Q(status=UserIntegrationStatus.PENDING.value),
+    ),
+    (
+        "integrations_token_expiry_idx",
+        ["expires_at"],
+        Q(status=UserIntegrationStatus.COMPLETED.value),
+    ),
+)
+
+
+class UserIntegrationIndexTests(TestCase):
+    def assertHasIndexes(self, indexes):
+        indexes = {index.name: index for index in indexes}
+        for name, fields, condition in USER_INTEGRATION_INDEXES:
+            with self.subTest(index=name):
+                self.assertIn(name, indexes)
+                self.assertEqual(indexes[name].fields, fields)
+                self.assertEqual(indexes[name].condition, condition)
+
+    def test_model_indexes(self):
+        self.assertHasIndexes(UserIntegration._meta.indexes)
+
+    def test_migrated_indexes(self):
+        state = MigrationLoader(None, ignore_no_migrations=True).project_state()
+        self.assertHasIndexes(
+            state.models["integrations", "userintegration"].options["indexes"]
+        )
+
+    def test_database_indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, UserIntegration._meta.db_table
+            )
+        for name, fields, _ in USER_INTEGRATION_INDEXES:
+            with self.subTest(index=name):
+                self.assertIn(name, constraints)
+                self.assertEqual(
+                    constraints[name]["columns"],
+                    [
+                        UserIntegration._meta.get_field(field.lstrip("-")).column
+                        for field in fields
+                    ],
+                )
+
+
+@skipUnless(connection.vendor == "postgresql", "Query plans are checked on PostgreSQL")
+class UserIntegrationQueryPlanTests(TestCase):
+    """
+    Checks that the hot UserIntegration queries are served by their indexes,
+    so their cost does not grow with the table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="runner@example.com")
+        other_user = User.objects.create(email="other@example.com")
+        for user in (cls.user, other_user):
+            for integration_name, _ in IntegrationName.choices():
+                for status, _ in UserIntegrationStatus.choices():
+                    UserIntegration.objects.create(
+                        user=user,
+                        integration_name=integration_name,
+                        status=status,
+                        state=f"{user.id}-{integration_name}-{status}",
+                        expires_at=timezone.now(),
+                    )
+
+    def assertUsesIndex(self, query, index_name):
+        with connection.cursor() as cursor:
+            # the test tables are small enough that a sequential scan would
+            # win, which says nothing about large tables
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            if isinstance(query, str):
+                cursor.execute(f"EXPLAIN {query}")
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            else:
+                plan = query.explain()
+        self.assertIn(index_name, plan)
+
+    def test_latest_connected_integration(self):
+        self.assertUsesIndex(
+            UserIntegration.objects.filter(
+                user=self.user,
+                integration_name=IntegrationName.Strava.value,
+                status=UserIntegrationStatus.COMPLETED.value,
+            ).order_by("-created")[:1],
+            "integrations_completed_idx",
+        )
+
+    def test_connected_integrations(self):
+        self.assertUsesIndex(
+            UserIntegration.objects.filter(
+                user=self.user, status=UserIntegrationStatus.COMPLETED.value
+            ).order_by("-created"),
+            "integrations_completed_idx",
+        )
+
+    def test_pending_oauth_callback_integration(self):
+        self.assertUsesIndex(
+            UserIntegration.objects.filter(
+                integration_name=IntegrationName.Strava.value,
+                state=f"{self.user.id}-strava-pending",
+                status=UserIntegrationStatus.PENDING.value,
+            ).order_by("-created")[:1],
+            "integrations_pending_state_idx",
+        )
+
+    def test_oauth_callbacks(self):
+        for integration in (StravaIntegration, FitbitIntegration):
+            name = integration.INTEGRATION_NAME.value
+            with self.subTest(integration=name):
+                request = RequestFactory().get(
+                    "/", {"code": "code", "state": f"{self.user.id}-{name}-pending"}
+                )
+                # the pending integration is looked up before the code is
+                # exchanged
+                with (
+                    mock.patch.object(
+                        integration, "exchange_code_for_token", side_effect=ValueError
+                    ),
+                    CaptureQueriesContext(connection) as queries,
+                    self.assertRaises(ValueError),
+                ):
+                    integration.handle_oauth_callback(request)
+                self.assertUsesIndex(
+                    queries[0]["sql"], "integrations_pending_state_idx"
+                )
+
+    def test_expiring_tokens(self):
+        self.assertUsesIndex(
+            UserIntegration.objects.filter(
+                status=UserIntegrationStatus.COMPLETED.value,
+                refresh_token__isnull=False,
+                expires_at__lt=timezone.now() + timedelta(hours=1),
+            ).order_by("expires_at"),
+            "integrations_token_expiry_idx",
+        )
+
+
+class FitRecordFieldTests(SimpleTestCase):
+    def test_out_of_range_values_are_invalid(self):
+        heart_rates = _field_values(np.array([150, 300], dtype=np.uint16), UINT8, 1, 0)
+        self.assertEqual(heart_rates.tolist(), [150, 0xFF])
+
+        # altitudes are stored as (metres + 500) * 5
+        altitudes = _field_values(np.array([100.0, -600.0, 20000.0]), UINT16, 5, 500)
+        self.assertEqual(altitudes.tolist(), [3000, 0xFFFF, 0xFFFF])
+
+    def test_missing_values_are_invalid(self):
+        altitudes = _field_values(np.array([np.nan]), UINT16, 5, 500)
+        self.assertEqual(altitudes.tolist(), [0xFFFF])
+
+    def test_encode_track_with_out_of_range_values(self):
+        track = Track(sport="running")
+        track.append(1700000000, 51.5, -0.1, altitude=-600, heart_rate=300)
+        track.append(1700000001, 51.5001, -0.1, altitude=35, heart_rate=140)
+        with encode_fit(track) as activity_file:
+            data = activity_file.open().read()
+        self.assertEqual(data[8:12], b".FIT")
+
+
+class ActivitySummaryListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="runner@example.com")
+        user_integration = UserIntegration.objects.create(
+            user=cls.user,
+            integration_name=IntegrationName.Strava.value,
+            status=UserIntegrationStatus.COMPLETED.value,
+        )
+        cls.start = timezone.now().replace(microsecond=0)
+        # runs sharing a start time, so pages split inside a start time
+        for index, hours in enumerate([0, 0, 0, 1, 1, 1, 2]):
+            ActivitySummary.objects.create(
+                user=cls.user,
+                user_integration=user_integration,
+                integration_name=IntegrationName.Strava.value,
+                activity_ref=str(index),
+                start_time=cls.start + timedelta(hours=hours),
+            )
+        cls.ordered_ids = list(
+            ActivitySummary.objects.order_by("-start_time", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_activities(self, **params):
+        return self.client.get(reverse("activity-list"), params)
+
+    def test_pages_do_not_skip_or_repeat_equal_start_times(self):
+        ids = []
+        params = {"limit": 2}
+        while True:
+            response = self.get_activities(**params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["activities"]), 2)
+            ids += [activity["id"] for activity in response.data["activities"]]
+            if response.data["next_cursor"] is None:
+                break
+            params["cursor"] = response.data["next_cursor"]
+
+        self.assertEqual(ids, self.ordered_ids)
+
+    def test_last_page_has_no_cursor(self):
+        response = self.get_activities(limit=len(self.ordered_ids))
+
+        self.assertEqual(len(response.data["activities"]), len(self.ordered_ids))
+        self.assertIsNone(response.data["next_cursor"])
+
+    @override_settings(ACTIVITY_LIST_MAX_PAGE_SIZE=3)
+    def test_limit_is_clamped(self):
+        response = self.get_activities(limit=100)
+
+        self.assertEqual(len(response.data["activities"]), 3)
+        self.assertIsNotNone(response.data["next_cursor"])
+
+    def test_start_time_filters(self):
+        response = self.get_activities(
+            start_after=(self.start + timedelta(hours=1)).isoformat(),
+            start_before=(self.start + timedelta(hours=2)).isoformat(),
+        )
+
+        self.assertEqual(
+            [activity["activity_ref"] for activity in response.data["activities"]],
+            ["5", "4", "3"],
+        )
+
+    def test_invalid_params(self):
+        for params in (
+            {"cursor": "not-a-cursor"},
+            {"cursor": "bm90IGEgY3Vyc29y"},
+            {"start_after": "yesterday"},
+            {"start_before": "2026-13-01"},
+            {"limit": "ten"},
+            {"limit": 0},
+        ):
+            with self.subTest(params=params):
+                response = self.get_activities(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.data)
+
+
+class AppsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email="runner@example.com")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_urls_follow_the_script_prefix(self):
+        url = reverse("apps")
+        for prefix in ("/", "/runsync/"):
+            with self.subTest(prefix=prefix):
+                # the WSGI handler sets the script prefix of each request
+                set_script_prefix(prefix)
+                self.addCleanup(set_script_prefix, "/")
+                response = self.client.get(url)
+                apps = {app["type"]: app for app in response.data}
+                self.assertEqual(
+                    apps[IntegrationName.Strava.value]["connect_url"],
+                    f"{prefix}integrations/strava/connect",
+                )
+                self.assertEqual(
+                    apps[IntegrationName.Strava.value]["activities_url"],
+                    f"{prefix}integrations/strava/activities",
+                )
@@ -0,0 +1,210 @@
+import math
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from integrations.streams import open_activity_file
+
+# TCX sports we can name; anything else is uploaded as a generic activity
+TCX_SPORTS = {"running": "running", "biking": "cycling"}
+EARTH_RADIUS = 6371008.8
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _parse_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def haversine_distances(latitudes, longitudes):
+    """
+    Returns the great-circle distance in metres between each pair of
+    consecutive points.
+    """
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    a = (
+        np.sin(np.diff(latitudes) / 2) ** 2
+        + np.cos(latitudes[:-1])
+        * np.cos(latitudes[1:])
+        * np.sin(np.diff(longitudes) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class Track:
+    """
+    The trackpoints of an activity, held column by column in typed arrays
+    rather than as an object per point. Timestamps are unix seconds and
+    distances are cumulative metres.
+
+    Missing coordinates, altitudes and distances are NaN. Missing heart rates
+    and cadences are 0.
+    """
+
+    COLUMNS = (
+        "timestamps",
+        "latitudes",
+        "longitudes",
+        "altitudes",
+        "distances",
+        "heart_rates",
+        "cadences",
+    )
+
+    def __init__(self, sport=None):
+        self.sport = sport
+        self.timestamps = array("d")
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.altitudes = array("d")
+        self.distances = array("d")
+        self.heart_rates = array("H")
+        self.cadences = array("H")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(
+        self,
+        timestamp,
+        latitude=math.nan,
+        longitude=math.nan,
+        altitude=math.nan,
+        distance=math.nan,
+        heart_rate=0,
+        cadence=0,
+    ):
+        self.timestamps.append(timestamp)
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        self.altitudes.append(altitude)
+        self.distances.append(distance)
+        self.heart_rates.append(heart_rate)
+        self.cadences.append(cadence)
+
+    def take(self, indices):
+        """
+        Returns a new Track with the points at `indices`.
+        """
+        track = Track(sport=self.sport)
+        for column, values in self.to_numpy().items():
+            getattr(track, column).frombytes(values[indices].tobytes())
+        return track
+
+    def to_numpy(self):
+        """
+        Returns the columns as NumPy arrays that share memory with the typed
+        arrays, keyed by column name. The track cannot grow while they exist.
+        """
+        return {column: np.asarray(getattr(self, column)) for column in self.COLUMNS}
+
+    @property
+    def start_time(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    @property
+    def duration(self):
+        return self.timestamps[-1] - self.timestamps[0] if self.timestamps else 0
+
+    @property
+    def distance(self):
+        """
+        The total distance in metres: the last recorded distance, or the
+        length of the GPS trace if the track records none.
+        """
+        distances = np.asarray(self.distances)
+        recorded = distances[~np.isnan(distances)]
+        if recorded.size:
+            return float(recorded[-1])
+        return self.path_length
+
+    @property
+    def path_length(self):
+        """
+        The length in metres of the GPS trace, whatever distances the track
+        records.
+        """
+        latitudes, longitudes = np.asarray(self.latitudes), np.asarray(self.longitudes)
+        located = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        return float(haversine_distances(latitudes[located], longitudes[located]).sum())
+
+
+def parse_track(fileobj):
+    """
+    Reads the trackpoints of a TCX or GPX file into a Track.
+
+    The file is parsed incrementally. Each trackpoint is dropped from the tree
+    once its values are read, so memory does not grow with the file.
+    """
+    track = Track()
+    # open elements, outermost first; trackpoints are removed from their
+    # parent as soon as they end
+    stack = []
+    point = None
+
+    for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+        name = _local_name(elem.tag)
+        if event == "start":
+            stack.append(elem)
+            if name in ("Trackpoint", "trkpt"):
+                point = {}
+            elif name == "Activity" and track.sport is None:
+                track.sport = TCX_SPORTS.get(elem.get("Sport", "").lower())
+            continue
+
+        stack.pop()
+        if name in ("Trackpoint", "trkpt"):
+            if name == "trkpt":
+                point["latitude"] = _parse_float(elem.get("lat"))
+                point["longitude"] = _parse_float(elem.get("lon"))
+            if "timestamp" in point:
+                track.append(**point)
+            point = None
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+        elif point is not None:
+            if name in ("Time", "time"):
+                point["timestamp"] = _parse_time(elem.text)
+            elif name == "LatitudeDegrees":
+                point["latitude"] = _parse_float(elem.text)
+            elif name == "LongitudeDegrees":
+                point["longitude"] = _parse_float(elem.text)
+            elif name in ("AltitudeMeters", "ele"):
+                point["altitude"] = _parse_float(elem.text)
+            elif name == "DistanceMeters":
+                point["distance"] = _parse_float(elem.text)
+            elif name == "Value" and _local_name(stack[-1].tag) == "HeartRateBpm":
+                point["heart_rate"] = _parse_int(elem.text)
+            elif name == "hr":
+                point["heart_rate"] = _parse_int(elem.text)
+            elif name in ("Cadence", "RunCadence", "cad"):
+                point["cadence"] = _parse_int(elem.text)
+
+    return track
+
+
+def read_track(activity_file):
+    """
+    Parses an ActivityFile, str or bytes into a Track.
+    """
+    reader, _ = open_activity_file(activity_file)
+    return parse_track(reader)
@@ -11,6 +11,11 @@ urlpatterns = [
         views.AppsView.as_view(),
         name="apps",
     ),
+    path(
+        "activities",
+        views.ActivitySummaryListView.as_view(),
+        name="activity-list",
+    ),
     path(
         "<str:integration_type>/connect",
         views.IntegrationOAuthView.as_view(),
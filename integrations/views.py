@@ -1,47 +1,77 @@
-from django.urls import reverse
+import base64
+import functools
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from adrf.views import APIView as AsyncAPIView
+from django.conf import settings
+from django.urls import get_script_prefix, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import Throttled
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from integrations.cache import activity_list_cache, connection_state_cache
 from integrations.constants import IntegrationName, UserIntegrationStatus
-from integrations.models import UserIntegration
-from integrations.serializers import AppSerializer, UserIntegrationListSerializer
+from integrations.models import ActivitySummary, UserIntegration
+from integrations.ratelimit import RateLimitExceeded
+from integrations.serializers import (
+    ActivitySummarySerializer,
+    AppSerializer,
+    UserIntegrationListSerializer,
+)
 from integrations.services import get_integration
 
 
+@functools.cache
+def get_apps():
+    """
+    Returns the name, type and URL paths of every app. The paths do not change
+    while the process runs, so they are reversed once, without the script
+    prefix, which can differ between requests.
+    """
+    prefix_length = len(get_script_prefix())
+    return [
+        {
+            "name": label,
+            "type": name,
+            "connect_url": reverse(
+                "integration-oauth", kwargs={"integration_type": name}
+            )[prefix_length:],
+            "activities_url": reverse(
+                "integration-activity", kwargs={"integration_type": name}
+            )[prefix_length:],
+        }
+        for name, label in IntegrationName.choices()
+    ]
+
+
 class AppsView(APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = AppSerializer
 
     def get(self, request):
-        all_apps = IntegrationName.choices()
-        connected_apps = (
-            UserIntegration.objects.filter(
-                user=request.user, status=UserIntegrationStatus.COMPLETED.value
+        connected_apps = {
+            user_integration["integration_name"]
+            for user_integration in connection_state_cache.get_connected(
+                request.user.id
             )
-            .order_by("integration_name", "-created")
-            .distinct("integration_name")
-            .values_list("integration_name", flat=True)
-        )
-
-        response = []
-        for app in all_apps:
-            app_data = {
-                "name": app[1],
-                "type": app[0],
-                "connect_url": reverse(
-                    "integration-oauth", kwargs={"integration_type": app[0]}
+        }
+        prefix = get_script_prefix()
+        apps = [
+            {
+                **app,
+                "connect_url": prefix + app["connect_url"],
+                "activities_url": prefix + app["activities_url"],
+                "status": (
+                    "connected" if app["type"] in connected_apps else "not_connected"
                 ),
-                "activities_url": reverse(
-                    "integration-activity", kwargs={"integration_type": app[0]}
-                ),
-                "status": "connected" if app[0] in connected_apps else "not_connected",
-                # "status": "not_connected" if app[0] in connected_apps else "connected",
             }
-            response.append(app_data)
-
-        response = self.serializer_class(response, many=True)
-        return Response(response.data)
+            for app in get_apps()
+        ]
+        return Response(self.serializer_class(apps, many=True).data)
 
 
 class ConnectedIntegrationsView(APIView):
@@ -49,11 +79,7 @@ class ConnectedIntegrationsView(APIView):
     serializer_class = UserIntegrationListSerializer
 
     def get(self, request):
-        integrations = UserIntegration.objects.filter(
-            user=request.user, status=UserIntegrationStatus.COMPLETED.value
-        ).order_by("-created")
-        serializer = self.serializer_class(integrations, many=True)
-        return Response(serializer.data)
+        return Response(connection_state_cache.get_connected(request.user.id))
 
 
 class IntegrationOAuthView(APIView):
@@ -68,25 +94,124 @@ class IntegrationOAuthView(APIView):
         return Response({"redirect_url": integration_url})
 
 
-class IntegrationActivityView(APIView):
+class IntegrationActivityView(AsyncAPIView):
+    """
+    Returns the user's activity list from the provider, served from a cache
+    that is refreshed in the background once it goes stale.
+    """
+
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, integration_type):
+    async def get(self, request, integration_type):
         integration = get_integration(integration_type)
         if not integration:
             return Response({"error": "Invalid integration type"}, status=400)
 
-        user_integration = (
+        user_integration = await (
             UserIntegration.objects.filter(
                 user=request.user,
                 integration_name=integration_type,
                 status=UserIntegrationStatus.COMPLETED.value,
             )
             .order_by("-created")
-            .first()
+            .afirst()
         )
         if not user_integration:
             return Response({"error": "User integration not found"}, status=400)
 
-        activities = integration(user_integration).fetch_activities()
+        try:
+            activities = await activity_list_cache.aget_activities(
+                integration(user_integration)
+            )
+        except RateLimitExceeded as e:
+            raise Throttled(wait=e.retry_after)
         return Response({"activities": activities})
+
+
+def encode_cursor(activity):
+    position = f"{activity.start_time.isoformat()}|{activity.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        start_time, activity_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(start_time), int(activity_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def parse_date_param(value):
+    """
+    Parses an ISO 8601 datetime or date query parameter. Dates and naive
+    datetimes are taken as UTC.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed_date = parse_date(value)
+        if parsed_date is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(parsed_date, datetime.min.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+class ActivitySummaryListView(AsyncAPIView):
+    """
+    Lists the user's activities from the local activity index, newest first,
+    without calling the providers. Filters by `provider`, `type`, and start
+    time with `start_after` (inclusive) and `start_before` (exclusive).
+
+    Pages are keyset paginated on (start_time, id). Pass a page's next_cursor
+    as `cursor` to get the next one.
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ActivitySummarySerializer
+
+    async def get(self, request):
+        params = request.query_params
+        activities = ActivitySummary.objects.filter(user=request.user)
+        if params.get("provider"):
+            activities = activities.filter(integration_name=params["provider"])
+        if params.get("type"):
+            activities = activities.filter(activity_type=params["type"])
+
+        try:
+            if params.get("start_after"):
+                activities = activities.filter(
+                    start_time__gte=parse_date_param(params["start_after"])
+                )
+            if params.get("start_before"):
+                activities = activities.filter(
+                    start_time__lt=parse_date_param(params["start_before"])
+                )
+            limit = min(
+                int(params.get("limit", settings.ACTIVITY_LIST_PAGE_SIZE)),
+                settings.ACTIVITY_LIST_MAX_PAGE_SIZE,
+            )
+            if limit < 1:
+                raise ValueError("Invalid limit")
+            if params.get("cursor"):
+                start_time, activity_id = decode_cursor(params["cursor"])
+                # rows after the cursor in (-start_time, -id) order
+                activities = activities.filter(start_time__lte=start_time).exclude(
+                    start_time=start_time, id__gte=activity_id
+                )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        page = [
+            activity
+            async for activity in activities.order_by("-start_time", "-id")[: limit + 1]
+        ]
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return Response(
+            {
+                "activities": self.serializer_class(page[:limit], many=True).data,
+                "next_cursor": next_cursor,
+            }
+        )
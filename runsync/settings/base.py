@@ -22,8 +22,10 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "django_extensions",
     "corsheaders",
+    "adrf",
     "users.apps.UsersConfig",
     "integrations.apps.IntegrationsConfig",
+    "syncer.apps.SyncerConfig",
 ]
 
 MIDDLEWARE = [
@@ -107,6 +109,26 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PBKDF2 iterations for new password hashes. 0 keeps Django's default.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", 0))
+PASSWORD_HASHERS = [
+    "users.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", os.path.join(BASE_DIR, "cache")),
+    }
+}
+
 # Internationalization
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
@@ -135,11 +157,26 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": os.environ.get("LOGIN_THROTTLE_IP_RATE", "20/min"),
+        "login_email": os.environ.get("LOGIN_THROTTLE_EMAIL_RATE", "5/min"),
+        "token_refresh": os.environ.get("TOKEN_REFRESH_THROTTLE_RATE", "30/min"),
+    },
 }
 
 # JWT Settings
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
-JWT_ACCESS_TOKEN_LIFETIME = 60 * 60 * 24  # 24 hours in seconds
+# Access tokens are short-lived. Clients renew them at /users/token/refresh
+# with a refresh token, which is rotated on every use.
+JWT_ACCESS_TOKEN_LIFETIME = int(
+    os.environ.get("JWT_ACCESS_TOKEN_LIFETIME", 15 * 60)
+)  # 15 minutes in seconds
+JWT_REFRESH_TOKEN_LIFETIME = int(
+    os.environ.get("JWT_REFRESH_TOKEN_LIFETIME", 30 * 24 * 60 * 60)
+)  # 30 days in seconds
+# Authenticated users are cached for JWT_USER_CACHE_TTL seconds, so most
+# requests do not query the users table. Saving a user clears its entry.
+JWT_USER_CACHE_TTL = int(os.environ.get("JWT_USER_CACHE_TTL", 60))
 
 
 INTEGRATION_CALLBACK_REDIRECT_URL_SUCCESS = os.environ.get(
@@ -153,8 +190,135 @@ INTEGRATION_CALLBACK_REDIRECT_URL_ERROR = os.environ.get(
 # Fitbit
 FITBIT_CLIENT_ID = os.environ.get("FITBIT_CLIENT_ID")
 FITBIT_CLIENT_SECRET = os.environ.get("FITBIT_CLIENT_SECRET")
+FITBIT_WEBHOOK_VERIFICATION_CODE = os.environ.get("FITBIT_WEBHOOK_VERIFICATION_CODE")
+FITBIT_WEBHOOK_SUBSCRIBER_ID = os.environ.get("FITBIT_WEBHOOK_SUBSCRIBER_ID")
 
 # Strava
 STRAVA_CLIENT_ID = os.environ.get("STRAVA_CLIENT_ID")
 STRAVA_CLIENT_SECRET = os.environ.get("STRAVA_CLIENT_SECRET")
 STRAVA_REDIRECT_URI = os.environ.get("STRAVA_REDIRECT_URI")
+STRAVA_WEBHOOK_CALLBACK_URL = os.environ.get("STRAVA_WEBHOOK_CALLBACK_URL")
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.environ.get("STRAVA_WEBHOOK_VERIFY_TOKEN")
+STRAVA_WEBHOOK_SUBSCRIPTION_ID = os.environ.get("STRAVA_WEBHOOK_SUBSCRIPTION_ID")
+# Gzip activity files before uploading them to Strava
+STRAVA_UPLOAD_GZIP = os.environ.get("STRAVA_UPLOAD_GZIP", "true").lower() == "true"
+
+# Integration HTTP client
+INTEGRATION_HTTP_POOL_CONNECTIONS = int(
+    os.environ.get("INTEGRATION_HTTP_POOL_CONNECTIONS", 10)
+)
+INTEGRATION_HTTP_POOL_MAXSIZE = int(os.environ.get("INTEGRATION_HTTP_POOL_MAXSIZE", 20))
+INTEGRATION_HTTP_POOL_BLOCK = (
+    os.environ.get("INTEGRATION_HTTP_POOL_BLOCK", "false").lower() == "true"
+)
+INTEGRATION_HTTP_CONNECT_TIMEOUT = float(
+    os.environ.get("INTEGRATION_HTTP_CONNECT_TIMEOUT", 5)
+)
+INTEGRATION_HTTP_READ_TIMEOUT = float(
+    os.environ.get("INTEGRATION_HTTP_READ_TIMEOUT", 30)
+)
+INTEGRATION_HTTP_MAX_RETRIES = int(os.environ.get("INTEGRATION_HTTP_MAX_RETRIES", 2))
+INTEGRATION_ASYNC_MAX_WORKERS = int(
+    os.environ.get("INTEGRATION_ASYNC_MAX_WORKERS", 100)
+)
+
+# Activity polling: re-read this many seconds before the stored cursor so that
+# activities uploaded late by devices are not skipped
+INTEGRATION_POLL_CURSOR_OVERLAP = int(
+    os.environ.get("INTEGRATION_POLL_CURSOR_OVERLAP", 60 * 60 * 6)
+)
+
+# Refresh provider access tokens this many seconds before they expire
+INTEGRATION_TOKEN_REFRESH_MARGIN = int(
+    os.environ.get("INTEGRATION_TOKEN_REFRESH_MARGIN", 5 * 60)
+)
+
+# Background token refresh sweep
+INTEGRATION_TOKEN_SWEEP_LOOKAHEAD = int(
+    os.environ.get("INTEGRATION_TOKEN_SWEEP_LOOKAHEAD", 30 * 60)
+)
+INTEGRATION_TOKEN_SWEEP_BATCH_SIZE = int(
+    os.environ.get("INTEGRATION_TOKEN_SWEEP_BATCH_SIZE", 20)
+)
+INTEGRATION_TOKEN_SWEEP_BATCH_INTERVAL = float(
+    os.environ.get("INTEGRATION_TOKEN_SWEEP_BATCH_INTERVAL", 1)
+)
+INTEGRATION_TOKEN_SWEEP_INTERVAL = int(
+    os.environ.get("INTEGRATION_TOKEN_SWEEP_INTERVAL", 5 * 60)
+)
+
+# Sync job queue
+SYNC_JOB_MAX_ATTEMPTS = int(os.environ.get("SYNC_JOB_MAX_ATTEMPTS", 5))
+SYNC_JOB_RETRY_BACKOFF = int(os.environ.get("SYNC_JOB_RETRY_BACKOFF", 30))
+SYNC_JOB_VISIBILITY_TIMEOUT = int(
+    os.environ.get("SYNC_JOB_VISIBILITY_TIMEOUT", 10 * 60)
+)
+SYNC_WORKER_PROCESSES = int(os.environ.get("SYNC_WORKER_PROCESSES", 2))
+SYNC_WORKER_POLL_INTERVAL = float(os.environ.get("SYNC_WORKER_POLL_INTERVAL", 2))
+
+# Convert activity files to FIT for targets that accept it
+SYNC_CONVERT_TO_FIT = os.environ.get("SYNC_CONVERT_TO_FIT", "true").lower() == "true"
+
+# An activity already on the target is not synced again. Activities match if
+# they start within SYNC_DUPLICATE_START_TOLERANCE seconds of each other and
+# their durations and distances differ by at most the given fractions.
+SYNC_DUPLICATE_START_TOLERANCE = int(
+    os.environ.get("SYNC_DUPLICATE_START_TOLERANCE", 120)
+)
+SYNC_DUPLICATE_DURATION_TOLERANCE = float(
+    os.environ.get("SYNC_DUPLICATE_DURATION_TOLERANCE", 0.1)
+)
+SYNC_DUPLICATE_DISTANCE_TOLERANCE = float(
+    os.environ.get("SYNC_DUPLICATE_DISTANCE_TOLERANCE", 0.1)
+)
+
+# Simplify activity tracks before converting them to FIT. Points are thinned to
+# one per SYNC_SIMPLIFY_INTERVAL seconds, then dropped while they stay within
+# SYNC_SIMPLIFY_TOLERANCE metres of the simplified line, keeping at least one
+# point every SYNC_SIMPLIFY_MAX_GAP seconds. A simplified track whose GPS trace
+# length or elapsed time drifts beyond the error bounds is not used.
+SYNC_SIMPLIFY_TRACKS = os.environ.get("SYNC_SIMPLIFY_TRACKS", "false").lower() == "true"
+SYNC_SIMPLIFY_TOLERANCE = float(os.environ.get("SYNC_SIMPLIFY_TOLERANCE", 2))
+SYNC_SIMPLIFY_INTERVAL = float(os.environ.get("SYNC_SIMPLIFY_INTERVAL", 3))
+SYNC_SIMPLIFY_MAX_GAP = float(os.environ.get("SYNC_SIMPLIFY_MAX_GAP", 30))
+SYNC_SIMPLIFY_MAX_DISTANCE_ERROR = float(
+    os.environ.get("SYNC_SIMPLIFY_MAX_DISTANCE_ERROR", 0.005)
+)
+SYNC_SIMPLIFY_MAX_DURATION_ERROR = float(
+    os.environ.get("SYNC_SIMPLIFY_MAX_DURATION_ERROR", 1)
+)
+
+# Share of each provider rate limit budget that calls of a given priority may
+# spend, keeping the remainder for higher priorities
+INTEGRATION_RATE_LIMIT_SHARES = {
+    "interactive": 1.0,
+    "sync": float(os.environ.get("INTEGRATION_RATE_LIMIT_SYNC_SHARE", 0.8)),
+    "background": float(os.environ.get("INTEGRATION_RATE_LIMIT_BACKGROUND_SHARE", 0.5)),
+}
+
+# Provider activity lists are cached for INTEGRATION_ACTIVITY_CACHE_TTL
+# seconds, then served stale for up to INTEGRATION_ACTIVITY_CACHE_STALE_TTL
+# more seconds while they are refreshed in the background
+INTEGRATION_ACTIVITY_CACHE_TTL = int(
+    os.environ.get("INTEGRATION_ACTIVITY_CACHE_TTL", 60)
+)
+INTEGRATION_ACTIVITY_CACHE_STALE_TTL = int(
+    os.environ.get("INTEGRATION_ACTIVITY_CACHE_STALE_TTL", 10 * 60)
+)
+
+# Each user's connected integrations are cached for this many seconds. Entries
+# are also cleared when an integration is connected or removed.
+INTEGRATION_CONNECTION_CACHE_TTL = int(
+    os.environ.get("INTEGRATION_CONNECTION_CACHE_TTL", 10 * 60)
+)
+
+# Page sizes of the activity list endpoint
+ACTIVITY_LIST_PAGE_SIZE = int(os.environ.get("ACTIVITY_LIST_PAGE_SIZE", 50))
+ACTIVITY_LIST_MAX_PAGE_SIZE = int(os.environ.get("ACTIVITY_LIST_MAX_PAGE_SIZE", 200))
+
+# Activity files are moved in chunks of this size and spooled to disk once
+# they outgrow the in-memory limit
+ACTIVITY_FILE_CHUNK_SIZE = int(os.environ.get("ACTIVITY_FILE_CHUNK_SIZE", 64 * 1024))
+ACTIVITY_FILE_SPOOL_MAX_SIZE = int(
+    os.environ.get("ACTIVITY_FILE_SPOOL_MAX_SIZE", 1024 * 1024)
+)
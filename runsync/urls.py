@@ -21,4 +21,5 @@ urlpatterns = [
     path("users/", include("users.urls")),
     path("integrations/", include("integrations.urls")),
     path("syncer/", include("syncer.urls")),
+    path("webhooks/", include("integrations.app_integrations.webhook_urls")),
 ]
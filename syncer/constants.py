@@ -0,0 +1,23 @@
+from enum import Enum
+
+
+class SyncJobStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    @classmethod
+    def choices(cls):
+        return [(choice.value, choice.name) for choice in cls]
+
+
+class SyncJobKind(Enum):
+    # copy one source activity to one target
+    SYNC = "sync"
+    # read new activities from the source and queue a sync for each target
+    POLL = "poll"
+
+    @classmethod
+    def choices(cls):
+        return [(choice.value, choice.name) for choice in cls]
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import structlog
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from integrations.http import close_sessions
+from syncer.models import SyncJob
+from syncer.services import process_sync_job
+
+logger = structlog.get_logger(__name__)
+
+
+def run_worker(stopping, poll_interval):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info("sync_worker_started", worker_id=worker_id)
+
+    last_requeue = 0
+    while not stopping.is_set():
+        close_old_connections()
+        try:
+            if time.monotonic() - last_requeue > settings.SYNC_JOB_VISIBILITY_TIMEOUT:
+                requeued = SyncJob.objects.requeue_stale(
+                    settings.SYNC_JOB_VISIBILITY_TIMEOUT
+                )
+                if requeued:
+                    logger.warning("requeued_stale_sync_jobs", count=requeued)
+                last_requeue = time.monotonic()
+
+            job = SyncJob.objects.claim(worker_id)
+            if job is None:
+                stopping.wait(poll_interval)
+                continue
+
+            logger.info("processing_sync_job", worker_id=worker_id, sync_job_id=job.id)
+            process_sync_job(job)
+        except Exception as e:
+            logger.error("error_in_sync_worker", worker_id=worker_id, error=e)
+            stopping.wait(poll_interval)
+
+    logger.info("sync_worker_stopped", worker_id=worker_id)
+
+
+class Command(BaseCommand):
+    help = "Runs worker processes that drain the sync job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.SYNC_WORKER_PROCESSES,
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.SYNC_WORKER_POLL_INTERVAL,
+            help="Seconds to wait before polling an empty queue again",
+        )
+
+    def handle(self, *args, **options):
+        # children must not inherit the parent's sockets
+        connections.close_all()
+        close_sessions()
+
+        context = multiprocessing.get_context("fork")
+        stopping = context.Event()
+
+        def stop(signum, frame):
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        workers = {}
+        while not stopping.is_set():
+            for index in range(options["processes"]):
+                worker = workers.get(index)
+                if worker is not None and worker.is_alive():
+                    continue
+                if worker is not None:
+                    logger.warning("sync_worker_exited", exitcode=worker.exitcode)
+
+                worker = context.Process(
+                    target=run_worker,
+                    args=(stopping, options["poll_interval"]),
+                    name=f"sync-worker-{index}",
+                )
+                worker.start()
+                workers[index] = worker
+            stopping.wait(1)
+
+        for worker in workers.values():
+            worker.join()
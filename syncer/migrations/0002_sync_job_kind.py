@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0005_alter_userintegration_integration_name_and_more"),
+        ("syncer", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="syncjob",
+            name="kind",
+            field=models.CharField(
+                choices=[("sync", "SYNC"), ("poll", "POLL")],
+                default="sync",
+                max_length=255,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="syncjob",
+            name="source_activity_ref",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name="syncjob",
+            name="target_user_integration",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="integrations.userintegration",
+            ),
+        ),
+    ]
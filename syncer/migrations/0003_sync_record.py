@@ -0,0 +1,136 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:34
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_sync_records(apps, schema_editor):
+    SyncJob = apps.get_model("syncer", "SyncJob")
+    SyncRecord = apps.get_model("syncer", "SyncRecord")
+    # the latest job for each activity and target provider wins
+    records = {}
+    for job in (
+        SyncJob.objects.filter(
+            kind="sync",
+            target_user_integration__isnull=False,
+            source_activity_ref__isnull=False,
+        )
+        .select_related("source_user_integration", "target_user_integration")
+        .order_by("created")
+    ):
+        key = (
+            job.user_id,
+            job.source_user_integration.integration_name,
+            job.source_activity_ref,
+            job.target_user_integration.integration_name,
+        )
+        records[key] = SyncRecord(
+            user_id=key[0],
+            source_integration_name=key[1],
+            source_activity_ref=key[2],
+            target_integration_name=key[3],
+            sync_job=job,
+        )
+    SyncRecord.objects.bulk_create(records.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("integrations", "0007_activitysummary"),
+        ("syncer", "0002_sync_job_kind"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    django_extensions.db.fields.ModificationDateTimeField(
+                        auto_now=True, verbose_name="modified"
+                    ),
+                ),
+                (
+                    "source_integration_name",
+                    models.CharField(
+                        choices=[("fitbit", "Fitbit"), ("strava", "Strava")],
+                        max_length=255,
+                    ),
+                ),
+                ("source_activity_ref", models.CharField(max_length=255)),
+                (
+                    "target_integration_name",
+                    models.CharField(
+                        choices=[("fitbit", "Fitbit"), ("strava", "Strava")],
+                        max_length=255,
+                    ),
+                ),
+            ],
+            options={
+                "get_latest_by": "modified",
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="syncjob",
+            name="idempotency_key",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="syncjob",
+            index=models.Index(
+                condition=models.Q(("idempotency_key__isnull", False)),
+                fields=["user", "idempotency_key"],
+                name="syncer_syncjob_idempotency_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="syncrecord",
+            name="sync_job",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="syncer.syncjob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="syncrecord",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="syncrecord",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "user",
+                    "source_integration_name",
+                    "source_activity_ref",
+                    "target_integration_name",
+                ),
+                name="syncer_syncrecord_uniq",
+            ),
+        ),
+        migrations.RunPython(backfill_sync_records, migrations.RunPython.noop),
+    ]
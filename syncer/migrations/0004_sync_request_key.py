@@ -0,0 +1,96 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:51
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_sync_request_keys(apps, schema_editor):
+    SyncJob = apps.get_model("syncer", "SyncJob")
+    SyncRequestKey = apps.get_model("syncer", "SyncRequestKey")
+    # the first job queued with each key describes its request
+    keys = {}
+    for job in (
+        SyncJob.objects.filter(idempotency_key__isnull=False)
+        .select_related("source_user_integration")
+        .order_by("created")
+    ):
+        key = keys.get((job.user_id, job.idempotency_key))
+        if key is None:
+            key = keys[
+                (job.user_id, job.idempotency_key)
+            ] = SyncRequestKey.objects.create(
+                user_id=job.user_id,
+                idempotency_key=job.idempotency_key,
+                source_integration_name=job.source_user_integration.integration_name,
+                source_activity_ref=job.source_activity_ref,
+            )
+        key.sync_jobs.add(job)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("syncer", "0003_sync_record"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncRequestKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    django_extensions.db.fields.ModificationDateTimeField(
+                        auto_now=True, verbose_name="modified"
+                    ),
+                ),
+                ("idempotency_key", models.CharField(max_length=255)),
+                (
+                    "source_integration_name",
+                    models.CharField(
+                        choices=[("fitbit", "Fitbit"), ("strava", "Strava")],
+                        max_length=255,
+                    ),
+                ),
+                ("source_activity_ref", models.CharField(max_length=255)),
+                (
+                    "sync_jobs",
+                    models.ManyToManyField(related_name="+", to="syncer.syncjob"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "get_latest_by": "modified",
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "idempotency_key"),
+                        name="syncer_syncrequestkey_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_sync_request_keys, migrations.RunPython.noop),
+    ]
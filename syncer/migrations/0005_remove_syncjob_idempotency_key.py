@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("syncer", "0004_sync_request_key"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="syncjob",
+            name="syncer_syncjob_idempotency_idx",
+        ),
+        migrations.RemoveField(
+            model_name="syncjob",
+            name="idempotency_key",
+        ),
+    ]
@@ -0,0 +1,204 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+from django_extensions.db.models import TimeStampedModel
+
+from integrations.constants import IntegrationName
+from integrations.models import UserIntegration
+from syncer.constants import SyncJobKind, SyncJobStatus
+from users.models import User
+
+
+class SyncJobQuerySet(models.QuerySet):
+    def claim(self, worker_id):
+        """
+        Atomically takes the next runnable job off the queue and marks it
+        running. Rows locked by other workers are skipped rather than waited
+        on, so any number of workers can poll the same table.
+        """
+        with transaction.atomic():
+            job = (
+                self.select_for_update(skip_locked=True)
+                .filter(
+                    status=SyncJobStatus.PENDING.value, run_after__lte=timezone.now()
+                )
+                .order_by("run_after")
+                .first()
+            )
+            if not job:
+                return None
+
+            job.status = SyncJobStatus.RUNNING.value
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_at = timezone.now()
+            job.save(
+                update_fields=[
+                    "status",
+                    "attempts",
+                    "locked_by",
+                    "locked_at",
+                    "modified",
+                ]
+            )
+            return job
+
+    def claim_siblings(self, job):
+        """
+        Claims the other runnable jobs that copy the same source activity as
+        `job`, so the activity can be downloaded once and uploaded to every
+        target together.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                self.select_for_update(skip_locked=True).filter(
+                    kind=SyncJobKind.SYNC.value,
+                    status=SyncJobStatus.PENDING.value,
+                    run_after__lte=now,
+                    source_user_integration_id=job.source_user_integration_id,
+                    source_activity_ref=job.source_activity_ref,
+                )
+            )
+            for sibling in jobs:
+                sibling.status = SyncJobStatus.RUNNING.value
+                sibling.attempts += 1
+                sibling.locked_by = job.locked_by
+                sibling.locked_at = now
+                sibling.modified = now
+            self.bulk_update(
+                jobs, ["status", "attempts", "locked_by", "locked_at", "modified"]
+            )
+            return jobs
+
+    def requeue_stale(self, timeout):
+        """
+        Puts running jobs whose worker has not finished them within `timeout`
+        seconds back on the queue, e.g. after the worker process died.
+        """
+        return self.filter(
+            status=SyncJobStatus.RUNNING.value,
+            locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+        ).update(
+            status=SyncJobStatus.PENDING.value,
+            locked_by=None,
+            locked_at=None,
+            run_after=timezone.now(),
+        )
+
+
+class SyncJob(TimeStampedModel):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(
+        max_length=255,
+        choices=SyncJobKind.choices(),
+        default=SyncJobKind.SYNC.value,
+    )
+    source_user_integration = models.ForeignKey(
+        UserIntegration, on_delete=models.CASCADE, related_name="+"
+    )
+    target_user_integration = models.ForeignKey(
+        UserIntegration,
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    source_activity_ref = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(
+        max_length=255,
+        choices=SyncJobStatus.choices(),
+        default=SyncJobStatus.PENDING.value,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(default=dict)
+    error = models.TextField(null=True, blank=True)
+
+    objects = SyncJobQuerySet.as_manager()
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(
+                fields=["run_after"],
+                name="syncer_syncjob_pending_idx",
+                condition=models.Q(status="pending"),
+            ),
+            models.Index(
+                fields=["locked_at"],
+                name="syncer_syncjob_running_idx",
+                condition=models.Q(status="running"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.source_activity_ref} - {self.status}"
+
+
+class SyncRecord(TimeStampedModel):
+    """
+    The sync of a source activity to a target provider. There is at most one
+    per activity and target, pointing at the job that synced it.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    source_integration_name = models.CharField(
+        max_length=255, choices=IntegrationName.choices()
+    )
+    source_activity_ref = models.CharField(max_length=255)
+    target_integration_name = models.CharField(
+        max_length=255, choices=IntegrationName.choices()
+    )
+    sync_job = models.ForeignKey(
+        SyncJob, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+
+    class Meta(TimeStampedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "user",
+                    "source_integration_name",
+                    "source_activity_ref",
+                    "target_integration_name",
+                ],
+                name="syncer_syncrecord_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.user_id} - {self.source_integration_name}:"
+            f"{self.source_activity_ref} -> {self.target_integration_name}"
+        )
+
+
+class SyncRequestKey(TimeStampedModel):
+    """
+    The Idempotency-Key of a sync request and the activity it asked to sync.
+    A key is claimed once per user, together with queuing the request's jobs,
+    so concurrent requests with the same key cannot both queue work.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=255)
+    source_integration_name = models.CharField(
+        max_length=255, choices=IntegrationName.choices()
+    )
+    source_activity_ref = models.CharField(max_length=255)
+    # the jobs returned for the request, including ones queued before it
+    sync_jobs = models.ManyToManyField(SyncJob, related_name="+")
+
+    class Meta(TimeStampedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "idempotency_key"],
+                name="syncer_syncrequestkey_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.idempotency_key}"
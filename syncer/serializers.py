@@ -0,0 +1,30 @@
+from rest_framework import serializers
+
+from syncer.models import SyncJob
+
+
+class SyncJobSerializer(serializers.ModelSerializer):
+    source_integration_name = serializers.CharField(
+        source="source_user_integration.integration_name"
+    )
+    target_integration_name = serializers.CharField(
+        source="target_user_integration.integration_name",
+        read_only=True,
+        allow_null=True,
+    )
+
+    class Meta:
+        model = SyncJob
+        fields = [
+            "id",
+            "kind",
+            "source_integration_name",
+            "target_integration_name",
+            "source_activity_ref",
+            "status",
+            "attempts",
+            "result",
+            "error",
+            "created",
+            "modified",
+        ]
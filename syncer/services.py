@@ -1,28 +1,467 @@
-from integrations.models import UserIntegration
-from integrations.services import get_integration
+from datetime import timedelta
 
+import structlog
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from integrations.app_integrations import submit_to_io_thread
+from integrations.cache import activity_list_cache
+from integrations.constants import RateLimitPriority, UserIntegrationStatus
+from integrations.fit import encode_fit
+from integrations.models import ActivitySummary, UserIntegration
+from integrations.ratelimit import RateLimitExceeded, rate_limit_priority
+from integrations.services import get_integration, index_activities
+from integrations.simplify import simplify_track
+from integrations.tracks import read_track
+from syncer.constants import SyncJobKind, SyncJobStatus
+from syncer.models import SyncJob, SyncRecord, SyncRequestKey
+
+logger = structlog.get_logger(__name__)
+
+
+def get_upload_files(source_activity_file, target_integrations):
+    """
+    Returns the source activity file in each format the targets may upload,
+    keyed by data type. Sources export TCX. It is converted to FIT once if any
+    target accepts FIT, and targets fall back to TCX if the conversion fails.
+
+    With SYNC_SIMPLIFY_TRACKS, the track is simplified before it is converted
+    to FIT. The TCX is uploaded as exported, with its laps and metadata.
+    """
+    upload_files = {"tcx": source_activity_file}
+    convert_to_fit = settings.SYNC_CONVERT_TO_FIT and any(
+        "fit" in target_integration.UPLOAD_FORMATS
+        for target_integration in target_integrations
+    )
+    if not convert_to_fit:
+        return upload_files
+
+    try:
+        track = read_track(source_activity_file)
+        if settings.SYNC_SIMPLIFY_TRACKS:
+            track = simplify_track(
+                track,
+                settings.SYNC_SIMPLIFY_TOLERANCE,
+                interval=settings.SYNC_SIMPLIFY_INTERVAL,
+                max_gap=settings.SYNC_SIMPLIFY_MAX_GAP,
+                max_distance_error=settings.SYNC_SIMPLIFY_MAX_DISTANCE_ERROR,
+                max_duration_error=settings.SYNC_SIMPLIFY_MAX_DURATION_ERROR,
+            )
+        upload_files["fit"] = encode_fit(track)
+    except Exception as e:
+        logger.warning("error_preparing_activity_file", error=e)
+    return upload_files
+
+
+def get_upload_format(target_integration, upload_files):
+    return next(
+        data_type
+        for data_type in target_integration.UPLOAD_FORMATS
+        if data_type in upload_files
+    )
+
+
+def close_upload_files(source_activity_file, upload_files):
+    source_activity_file.close()
+    for upload_file in upload_files.values():
+        upload_file.close()
+
+
+class FanOutActivitySyncer:
+    """
+    Copies one source activity to several targets. The activity file is
+    downloaded once into a spooled buffer, prepared once in each format the
+    targets prefer, and streamed to all targets concurrently.
+    """
 
-class ActivitySyncer:
     def __init__(
         self,
         source_user_integration: UserIntegration,
-        target_user_integration: UserIntegration,
+        target_user_integrations: list[UserIntegration],
     ):
         self.source_user_integration = source_user_integration
-        self.target_user_integration = target_user_integration
+        # a target listed more than once, e.g. by duplicate jobs, is uploaded
+        # to once, and its outcome is shared by every job for it
+        self.target_user_integrations = list(
+            {
+                target_user_integration.id: target_user_integration
+                for target_user_integration in target_user_integrations
+            }.values()
+        )
         self.source_integration = get_integration(
             source_user_integration.integration_name
         )(source_user_integration)
-        self.target_integration = get_integration(
-            target_user_integration.integration_name
-        )(target_user_integration)
+        self.target_integrations = [
+            get_integration(target_user_integration.integration_name)(
+                target_user_integration
+            )
+            for target_user_integration in self.target_user_integrations
+        ]
 
     def sync(self, source_activity_ref):
+        """
+        Returns the outcome for each target, keyed by target UserIntegration
+        id, as {"result": ..., "error": ...}. Errors from the download are
+        raised, since no target can proceed without the file.
+        """
         (
             source_activity_file,
             source_activity_file_type,
         ) = self.source_integration.get_activity_file(source_activity_ref)
-        target_activity_file = self.target_integration.upload_activity(
-            source_activity_file, file_metadata={"type": source_activity_file_type}
+
+        upload_files = get_upload_files(source_activity_file, self.target_integrations)
+        results = {}
+        try:
+            # uploads in the same format stream from the same spooled file
+            futures = {}
+            for target_integration in self.target_integrations:
+                data_type = get_upload_format(target_integration, upload_files)
+                futures[target_integration.user_integration.id] = submit_to_io_thread(
+                    target_integration.upload_activity,
+                    upload_files[data_type],
+                    file_metadata={
+                        "type": source_activity_file_type,
+                        "data_type": data_type,
+                    },
+                )
+            for target_id, future in futures.items():
+                try:
+                    results[target_id] = {"result": future.result(), "error": None}
+                except Exception as e:
+                    results[target_id] = {"result": None, "error": e}
+        finally:
+            close_upload_files(source_activity_file, upload_files)
+        return results
+
+
+def create_sync_job(
+    source_user_integration,
+    target_user_integration,
+    source_activity_ref,
+):
+    return SyncJob.objects.create(
+        user_id=source_user_integration.user_id,
+        kind=SyncJobKind.SYNC.value,
+        source_user_integration=source_user_integration,
+        target_user_integration=target_user_integration,
+        source_activity_ref=source_activity_ref,
+    )
+
+
+def queue_sync_jobs(
+    source_user_integration: UserIntegration,
+    target_user_integrations: list[UserIntegration],
+    source_activity_ref: str,
+    retry_failed=True,
+):
+    """
+    Queues a sync of the source activity to each target provider it has not
+    been synced to, recording it in a SyncRecord. Returns a (job, created)
+    pair per target.
+
+    Targets that already have a record keep its job, so retried requests and
+    repeated polls do not upload again. A failed job is replaced with a new
+    one if `retry_failed` is set.
+    """
+    user_id = source_user_integration.user_id
+    source_integration_name = source_user_integration.integration_name
+    records = {
+        record.target_integration_name: record
+        for record in SyncRecord.objects.select_related(
+            "sync_job__target_user_integration"
+        ).filter(
+            user_id=user_id,
+            source_integration_name=source_integration_name,
+            source_activity_ref=source_activity_ref,
+            target_integration_name__in=[
+                target_user_integration.integration_name
+                for target_user_integration in target_user_integrations
+            ],
+        )
+    }
+
+    queued_jobs = []
+    for target_user_integration in target_user_integrations:
+        record = records.get(target_user_integration.integration_name)
+        if (
+            record
+            and record.sync_job
+            and not (
+                retry_failed and record.sync_job.status == SyncJobStatus.FAILED.value
+            )
+        ):
+            queued_jobs.append((record.sync_job, False))
+            continue
+
+        try:
+            with transaction.atomic():
+                job = create_sync_job(
+                    source_user_integration,
+                    target_user_integration,
+                    source_activity_ref,
+                )
+                if record:
+                    record.sync_job = job
+                    record.save(update_fields=["sync_job", "modified"])
+                else:
+                    SyncRecord.objects.create(
+                        user_id=user_id,
+                        source_integration_name=source_integration_name,
+                        source_activity_ref=source_activity_ref,
+                        target_integration_name=target_user_integration.integration_name,
+                        sync_job=job,
+                    )
+        except IntegrityError:
+            # queued concurrently by another request or poll
+            record = SyncRecord.objects.select_related(
+                "sync_job__target_user_integration"
+            ).get(
+                user_id=user_id,
+                source_integration_name=source_integration_name,
+                source_activity_ref=source_activity_ref,
+                target_integration_name=target_user_integration.integration_name,
+            )
+            if record.sync_job:
+                queued_jobs.append((record.sync_job, False))
+                continue
+
+            # the record's job has been deleted since, so it gets a new one
+            job = create_sync_job(
+                source_user_integration,
+                target_user_integration,
+                source_activity_ref,
+            )
+            record.sync_job = job
+            record.save(update_fields=["sync_job", "modified"])
+
+        queued_jobs.append((job, True))
+    return queued_jobs
+
+
+def queue_sync_request(
+    source_user_integration: UserIntegration,
+    target_user_integrations: list[UserIntegration],
+    source_activity_ref: str,
+    idempotency_key: str,
+):
+    """
+    Claims the Idempotency-Key of a sync request and queues its jobs in one
+    transaction. Returns the (job, created) pairs, or None if the key had
+    already been claimed, in which case the original request is replayed.
+
+    The key is unique per user, so of concurrent requests with the same key
+    only the first queues anything. The others wait for it to commit.
+    """
+    with transaction.atomic():
+        request_key, created = SyncRequestKey.objects.get_or_create(
+            user_id=source_user_integration.user_id,
+            idempotency_key=idempotency_key,
+            defaults={
+                "source_integration_name": source_user_integration.integration_name,
+                "source_activity_ref": source_activity_ref,
+            },
+        )
+        if not created:
+            return None
+
+        queued_jobs = queue_sync_jobs(
+            source_user_integration,
+            target_user_integrations,
+            source_activity_ref,
+        )
+        request_key.sync_jobs.set([job for job, _ in queued_jobs])
+    return queued_jobs
+
+
+def enqueue_poll_job(user_integration: UserIntegration):
+    """
+    Queues a poll of the integration's new activities, unless one is already
+    waiting to run.
+
+    The integration's row is locked while checking, so webhook deliveries
+    that arrive together queue one poll between them.
+    """
+    with transaction.atomic():
+        UserIntegration.objects.select_for_update().get(pk=user_integration.pk)
+        job = SyncJob.objects.filter(
+            kind=SyncJobKind.POLL.value,
+            source_user_integration=user_integration,
+            status=SyncJobStatus.PENDING.value,
+        ).first()
+        if job:
+            return job
+
+        return SyncJob.objects.create(
+            user_id=user_integration.user_id,
+            kind=SyncJobKind.POLL.value,
+            source_user_integration=user_integration,
+        )
+
+
+def poll_source_activities(job: SyncJob):
+    """
+    Reads the activities added to the source since its last poll and queues a
+    sync of each one to every other integration the user has connected.
+    Activities that we uploaded ourselves are skipped so that syncs do not
+    bounce back and forth between providers.
+    """
+    source_user_integration = job.source_user_integration
+    source_integration = get_integration(source_user_integration.integration_name)(
+        source_user_integration
+    )
+    target_user_integrations = list(
+        UserIntegration.objects.filter(
+            user_id=job.user_id, status=UserIntegrationStatus.COMPLETED.value
+        )
+        .exclude(integration_name=source_user_integration.integration_name)
+        .order_by("integration_name", "-created")
+        .distinct("integration_name")
+    )
+
+    queued = 0
+    # each activity is indexed and queued before the next one is read, so the
+    # poll cursor only advances once all of them have been queued
+    for activity in source_integration.poll_activities():
+        # our own uploads are indexed too, so later syncs can tell the
+        # activity is already here
+        index_activities(source_user_integration, [activity])
+        if source_integration.is_own_upload(activity):
+            continue
+
+        queued_jobs = queue_sync_jobs(
+            source_user_integration,
+            target_user_integrations,
+            str(source_integration.get_activity_ref(activity)),
+            retry_failed=False,
+        )
+        queued += sum(created for _, created in queued_jobs)
+
+    return {"queued": queued}
+
+
+def finish_sync_job(job: SyncJob, result=None, error=None):
+    """
+    Records the outcome of a claimed job. Failed jobs are put back on the
+    queue with exponential backoff until SYNC_JOB_MAX_ATTEMPTS is reached.
+    Jobs that would exceed a provider's rate limit budget are deferred until
+    the budget resets, without using up an attempt.
+    """
+    if error is None:
+        job.result = result
+        job.status = SyncJobStatus.COMPLETED.value
+        job.error = None
+    elif isinstance(error, RateLimitExceeded):
+        logger.info(
+            "deferring_rate_limited_sync_job",
+            sync_job_id=job.id,
+            retry_after=error.retry_after,
+        )
+        job.status = SyncJobStatus.PENDING.value
+        job.attempts -= 1
+        job.run_after = timezone.now() + timedelta(seconds=error.retry_after)
+    else:
+        logger.error("error_processing_sync_job", sync_job_id=job.id, error=error)
+        job.error = str(error)
+        if job.attempts < settings.SYNC_JOB_MAX_ATTEMPTS:
+            job.status = SyncJobStatus.PENDING.value
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.SYNC_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = SyncJobStatus.FAILED.value
+
+    job.locked_by = None
+    job.locked_at = None
+    job.save(
+        update_fields=[
+            "result",
+            "status",
+            "attempts",
+            "error",
+            "run_after",
+            "locked_by",
+            "locked_at",
+            "modified",
+        ]
+    )
+    return job
+
+
+def skip_duplicate_sync_jobs(jobs: list[SyncJob]):
+    """
+    Completes the jobs whose target already has the source activity, going by
+    the activity index, and returns the others. Nothing is skipped if the
+    source activity has not been indexed by a poll.
+    """
+    source_activity = ActivitySummary.objects.filter(
+        user_id=jobs[0].user_id,
+        integration_name=jobs[0].source_user_integration.integration_name,
+        activity_ref=jobs[0].source_activity_ref,
+    ).first()
+    if not source_activity:
+        return jobs
+
+    remaining = []
+    for job in jobs:
+        duplicate = ActivitySummary.objects.find_duplicate(
+            job.user_id,
+            job.target_user_integration.integration_name,
+            source_activity.start_time,
+            source_activity.duration,
+            source_activity.distance,
         )
-        return target_activity_file
+        if duplicate:
+            logger.info(
+                "skipping_duplicate_sync_job",
+                sync_job_id=job.id,
+                duplicate_activity_ref=duplicate.activity_ref,
+            )
+            finish_sync_job(job, result={"duplicate_of": duplicate.activity_ref})
+        else:
+            remaining.append(job)
+    return remaining
+
+
+def process_sync_job(job: SyncJob):
+    """
+    Runs a claimed job. A sync job is run together with any other queued
+    jobs for the same source activity, so the file is downloaded only once.
+    Jobs whose target already has the activity are skipped before any of
+    it is downloaded.
+
+    Polls run at background priority and syncs at sync priority, so neither
+    can spend the budget reserved for interactive requests.
+    """
+    if job.kind == SyncJobKind.POLL.value:
+        try:
+            with rate_limit_priority(RateLimitPriority.BACKGROUND):
+                result = poll_source_activities(job)
+        except Exception as e:
+            return finish_sync_job(job, error=e)
+        return finish_sync_job(job, result=result)
+
+    jobs = skip_duplicate_sync_jobs([job, *SyncJob.objects.claim_siblings(job)])
+    if not jobs:
+        return job
+
+    try:
+        syncer = FanOutActivitySyncer(
+            job.source_user_integration,
+            [sibling.target_user_integration for sibling in jobs],
+        )
+        with rate_limit_priority(RateLimitPriority.SYNC):
+            results = syncer.sync(job.source_activity_ref)
+    except Exception as e:
+        for sibling in jobs:
+            finish_sync_job(sibling, error=e)
+        return job
+
+    for sibling in jobs:
+        outcome = results[sibling.target_user_integration_id]
+        if outcome["error"] is None:
+            activity_list_cache.invalidate(
+                sibling.user_id, sibling.target_user_integration.integration_name
+            )
+        finish_sync_job(sibling, **outcome)
+    return job
@@ -8,4 +8,9 @@ urlpatterns = [
         views.IntegrationSyncView.as_view(),
         name="integration-sync",
     ),
+    path(
+        "sync/<int:job_id>",
+        views.SyncJobView.as_view(),
+        name="sync-job",
+    ),
 ]
@@ -1,42 +1,168 @@
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
 from integrations.constants import UserIntegrationStatus
 from integrations.models import UserIntegration
-from syncer.services import ActivitySyncer
+from syncer.models import SyncJob, SyncRequestKey
+from syncer.serializers import SyncJobSerializer
+from syncer.services import queue_sync_jobs, queue_sync_request
 
 
 class IntegrationSyncView(APIView):
+    """
+    Queues a sync of a source activity to one or more targets. Activities
+    already synced to a target are not synced again. A request repeated with
+    the same Idempotency-Key header gets the jobs of the original request.
+    """
+
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
+    async def post(self, request):
         source_integration_name = request.data.get("source_integration_name")
-        target_integration_name = request.data.get("target_integration_name")
+        target_integration_names = request.data.get("target_integration_names") or [
+            request.data.get("target_integration_name")
+        ]
         source_activity_ref = request.data.get("source_activity_ref")
+        if not source_activity_ref:
+            return Response({"error": "No source activity provided"}, status=400)
+        source_activity_ref = str(source_activity_ref)
+
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if idempotency_key:
+            if len(idempotency_key) > 255:
+                return Response({"error": "Idempotency key too long"}, status=400)
+
+            response = await self.get_replay_response(
+                request.user,
+                idempotency_key,
+                source_integration_name,
+                source_activity_ref,
+            )
+            if response:
+                return response
 
-        source_user_integration = (
+        source_user_integration = await (
             UserIntegration.objects.filter(
                 user=request.user,
                 integration_name=source_integration_name,
                 status=UserIntegrationStatus.COMPLETED.value,
             )
             .order_by("-created")
-            .first()
+            .afirst()
         )
 
-        target_user_integration = (
-            UserIntegration.objects.filter(
+        target_user_integrations = [
+            target_user_integration
+            async for target_user_integration in UserIntegration.objects.filter(
                 user=request.user,
-                integration_name=target_integration_name,
+                integration_name__in=target_integration_names,
                 status=UserIntegrationStatus.COMPLETED.value,
             )
-            .order_by("-created")
-            .first()
+            .order_by("integration_name", "-created")
+            .distinct("integration_name")
+        ]
+        if not source_user_integration or len(target_user_integrations) != len(
+            set(target_integration_names)
+        ):
+            return Response({"error": "User integration not found"}, status=400)
+
+        # one job per target; workers pick up jobs for the same activity
+        # together and download it only once
+        if not idempotency_key:
+            queued_jobs = await sync_to_async(queue_sync_jobs)(
+                source_user_integration, target_user_integrations, source_activity_ref
+            )
+            return self.get_jobs_response([job for job, _ in queued_jobs])
+
+        queued_jobs = await sync_to_async(queue_sync_request)(
+            source_user_integration,
+            target_user_integrations,
+            source_activity_ref,
+            idempotency_key,
         )
+        if queued_jobs is None:
+            # a concurrent request with the same key claimed it first
+            return await self.get_replay_response(
+                request.user,
+                idempotency_key,
+                source_integration_name,
+                source_activity_ref,
+            )
+        return self.get_jobs_response([job for job, _ in queued_jobs])
+
+    async def get_replay_response(
+        self, user, idempotency_key, source_integration_name, source_activity_ref
+    ):
+        """
+        Returns the response to a request whose Idempotency-Key has been used
+        before, or None if it has not.
+        """
+        request_key = await SyncRequestKey.objects.filter(
+            user=user, idempotency_key=idempotency_key
+        ).afirst()
+        if not request_key:
+            return None
 
-        syncer = ActivitySyncer(source_user_integration, target_user_integration)
-        target_activity_file = syncer.sync(source_activity_ref)
+        if (
+            request_key.source_integration_name != source_integration_name
+            or request_key.source_activity_ref != source_activity_ref
+        ):
+            return Response(
+                {"error": "Idempotency key already used for another sync"},
+                status=422,
+            )
+
+        jobs = [
+            job
+            async for job in request_key.sync_jobs.select_related(
+                "target_user_integration"
+            ).order_by("id")
+        ]
+        if not jobs:
+            return Response(
+                {"error": "A request with this idempotency key is in progress"},
+                status=409,
+            )
+
+        response = self.get_jobs_response(jobs)
+        response["Idempotent-Replayed"] = "true"
+        return response
+
+    def get_jobs_response(self, jobs):
         return Response(
-            {"message": "Synced activity", "target_activity_file": target_activity_file}
+            {
+                "message": "Sync queued",
+                "jobs": [
+                    {
+                        "job_id": job.id,
+                        "target_integration_name": (
+                            job.target_user_integration.integration_name
+                        ),
+                        "status": job.status,
+                    }
+                    for job in jobs
+                ],
+            },
+            status=status.HTTP_202_ACCEPTED,
         )
+
+
+class SyncJobView(APIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = SyncJobSerializer
+
+    async def get(self, request, job_id):
+        job = await (
+            SyncJob.objects.select_related(
+                "source_user_integration", "target_user_integration"
+            )
+            .filter(user=request.user, id=job_id)
+            .afirst()
+        )
+        if not job:
+            return Response({"error": "Sync job not found"}, status=404)
+
+        return Response(self.serializer_class(job).data)
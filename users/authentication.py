@@ -1,8 +1,7 @@
-from datetime import datetime
-
 import jwt
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.utils.translation import gettext_lazy as _
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
@@ -10,6 +9,30 @@ from rest_framework.exceptions import AuthenticationFailed
 User = get_user_model()
 
 
+def user_principal_cache_key(user_id):
+    return f"users:principal:{user_id}"
+
+
+def get_user_principal(user_id):
+    """
+    Returns the user a token was issued to, from the cache when it was loaded
+    in the last JWT_USER_CACHE_TTL seconds.
+
+    The password hash is not loaded, so it never reaches the cache. Saving the
+    returned user only writes the fields that were loaded.
+    """
+    key = user_principal_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.defer("password").get(id=user_id)
+        cache.set(key, user, timeout=settings.JWT_USER_CACHE_TTL)
+    return user
+
+
+def invalidate_user_principal(user_id):
+    cache.delete(user_principal_cache_key(user_id))
+
+
 class JWTAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
         auth_header = request.META.get("HTTP_AUTHORIZATION")
@@ -23,29 +46,28 @@ class JWTAuthentication(authentication.BaseAuthentication):
                 return None
             token = auth_parts[1]
 
-            # Decode and verify the token
+            # Decode and verify the token, including its expiry
             payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=["HS256"])
 
-            # Check if token is expired
-            exp = payload.get("exp")
-            if exp and datetime.utcfromtimestamp(exp) < datetime.utcnow():
-                raise AuthenticationFailed(_("Token has expired"))
-
             # Get the user
             user_id = payload.get("user_id")
             if not user_id:
                 raise AuthenticationFailed(_("Invalid token payload"))
 
-            user = User.objects.get(id=user_id)
+            user = get_user_principal(user_id)
             if not user.is_active:
                 raise AuthenticationFailed(_("User is inactive"))
 
             return (user, None)
 
+        except jwt.ExpiredSignatureError:
+            raise AuthenticationFailed(_("Token has expired"))
         except jwt.InvalidTokenError:
             raise AuthenticationFailed(_("Invalid token"))
         except User.DoesNotExist:
             raise AuthenticationFailed(_("User not found"))
+        except AuthenticationFailed:
+            raise
         except Exception as e:
             raise AuthenticationFailed(str(e))
 
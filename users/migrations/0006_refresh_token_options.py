@@ -0,0 +1,16 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0005_refresh_token"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="refreshtoken",
+            options={"get_latest_by": "modified"},
+        ),
+    ]
@@ -1,3 +1,6 @@
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.db import models
 from django_extensions.db.models import TimeStampedModel
@@ -34,3 +37,29 @@ class User(AbstractBaseUser, TimeStampedModel):
 
     def __str__(self):
         return self.email
+
+
+class RefreshToken(TimeStampedModel):
+    """
+    A refresh token issued to a user. Only the SHA-256 hash of the token is
+    stored. Each refresh revokes the token and issues a new one in the same
+    family.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="refresh_tokens",
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    family = models.UUIDField(default=uuid.uuid4)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=["family"], name="users_refreshtoken_family_idx"),
+        ]
+
+    def __str__(self):
+        return f"RefreshToken {self.id} for {self.user_id}"
@@ -22,9 +22,15 @@ class LoginSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError("Account is disabled")
 
+        # handed to the view so the password is only checked once
+        data["user"] = user
         return data
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(required=True, max_length=128)
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(required=True, min_length=3, max_length=30)
     last_name = serializers.CharField(required=True, min_length=3, max_length=30)
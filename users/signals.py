@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.authentication import invalidate_user_principal
+from users.models import User
+from users.tokens import revoke_refresh_tokens
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # a deactivated user or a changed password takes effect on the next
+    # request rather than when the cached principal expires
+    invalidate_user_principal(instance.id)
+
+
+@receiver(post_save, sender=User)
+def revoke_user_tokens(sender, instance, created, **kwargs):
+    # set_password leaves the new password in _password until the save
+    # completes. Rehashing on login clears it first, so upgrading the hash
+    # does not log the user out.
+    password_changed = instance._password is not None
+    if not created and (password_changed or not instance.is_active):
+        revoke_refresh_tokens(instance.id)
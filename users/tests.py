@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users.models import RefreshToken, User
+from users.tokens import InvalidRefreshToken, issue_tokens, rotate_refresh_token
+
+
+@override_settings(JWT_SECRET_KEY="test-secret")
+class RefreshTokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("runner@example.com", "password")
+
+    def test_rotate(self):
+        tokens = issue_tokens(self.user)
+
+        user, rotated = rotate_refresh_token(tokens["refresh_token"])
+
+        self.assertEqual(user, self.user)
+        self.assertNotEqual(rotated["refresh_token"], tokens["refresh_token"])
+        old, new = RefreshToken.objects.order_by("id")
+        self.assertIsNotNone(old.revoked_at)
+        self.assertIsNone(new.revoked_at)
+        self.assertEqual(old.family, new.family)
+
+    def test_reuse_revokes_family(self):
+        tokens = issue_tokens(self.user)
+        _, rotated = rotate_refresh_token(tokens["refresh_token"])
+        other_family = issue_tokens(self.user)
+
+        with self.assertRaisesMessage(
+            InvalidRefreshToken, "Refresh token has been revoked"
+        ):
+            rotate_refresh_token(tokens["refresh_token"])
+
+        # the token issued by the legitimate rotation is revoked too
+        with self.assertRaises(InvalidRefreshToken):
+            rotate_refresh_token(rotated["refresh_token"])
+        self.assertFalse(
+            RefreshToken.objects.filter(
+                family=RefreshToken.objects.first().family, revoked_at__isnull=True
+            ).exists()
+        )
+        # other sessions of the user are left alone
+        rotate_refresh_token(other_family["refresh_token"])
+
+    def test_expired(self):
+        tokens = issue_tokens(self.user)
+        RefreshToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with self.assertRaisesMessage(InvalidRefreshToken, "Refresh token has expired"):
+            rotate_refresh_token(tokens["refresh_token"])
+
+    def test_unknown(self):
+        with self.assertRaisesMessage(InvalidRefreshToken, "Invalid refresh token"):
+            rotate_refresh_token("unknown")
+
+    def test_password_change_revokes_tokens(self):
+        tokens = issue_tokens(self.user)
+
+        self.user.set_password("new password")
+        self.user.save()
+
+        with self.assertRaisesMessage(
+            InvalidRefreshToken, "Refresh token has been revoked"
+        ):
+            rotate_refresh_token(tokens["refresh_token"])
+
+    def test_password_rehash_keeps_tokens(self):
+        User.objects.filter(id=self.user.id).update(
+            password=make_password("password", hasher="pbkdf2_sha1")
+        )
+        user = User.objects.get(id=self.user.id)
+        tokens = issue_tokens(user)
+
+        self.assertTrue(user.check_password("password"))
+        self.assertFalse(user.password.startswith("pbkdf2_sha1$"))
+        rotate_refresh_token(tokens["refresh_token"])
+
+    def test_deactivation_revokes_tokens(self):
+        tokens = issue_tokens(self.user)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(InvalidRefreshToken):
+            rotate_refresh_token(tokens["refresh_token"])
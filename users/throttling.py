@@ -0,0 +1,33 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """
+    Limits login attempts from a client IP address.
+    """
+
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+class LoginEmailThrottle(SimpleRateThrottle):
+    """
+    Limits login attempts for an email address, from any number of clients.
+    """
+
+    scope = "login_email"
+
+    def get_cache_key(self, request, view):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email.strip():
+            return None
+
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": email.strip().lower(),
+        }
@@ -0,0 +1,113 @@
+import hashlib
+import secrets
+import uuid
+from datetime import timedelta
+
+import jwt
+import structlog
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import RefreshToken
+
+logger = structlog.get_logger(__name__)
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_access_token(user):
+    expires_at = timezone.now() + timedelta(seconds=settings.JWT_ACCESS_TOKEN_LIFETIME)
+    payload = {
+        "user_id": user.id,
+        "email": user.email,
+        "exp": expires_at,
+    }
+    token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm="HS256")
+    return token, expires_at
+
+
+def create_refresh_token(user, family=None):
+    token = secrets.token_urlsafe(32)
+    refresh_token = RefreshToken.objects.create(
+        user=user,
+        token_hash=hash_token(token),
+        family=family or uuid.uuid4(),
+        expires_at=timezone.now()
+        + timedelta(seconds=settings.JWT_REFRESH_TOKEN_LIFETIME),
+    )
+    return token, refresh_token.expires_at
+
+
+def issue_tokens(user, family=None):
+    """
+    Returns a new access token and refresh token for `user`. The refresh token
+    starts a new family unless `family` is given.
+    """
+    token, expires_at = create_access_token(user)
+    refresh_token, refresh_expires_at = create_refresh_token(user, family)
+    return {
+        "token": token,
+        "expires_at": expires_at,
+        "refresh_token": refresh_token,
+        "refresh_expires_at": refresh_expires_at,
+    }
+
+
+def rotate_refresh_token(token):
+    """
+    Exchanges a refresh token for a new access token and refresh token,
+    without checking the user's password. Returns the user and the new tokens.
+
+    Each refresh token can be used once. A revoked token being presented again
+    means it was copied, so its whole family is revoked and the user has to
+    log in again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        refresh_token = (
+            RefreshToken.objects.select_for_update(of=("self",))
+            .select_related("user")
+            .filter(token_hash=hash_token(token))
+            .first()
+        )
+        if refresh_token is None:
+            raise InvalidRefreshToken("Invalid refresh token")
+
+        if not refresh_token.user.is_active:
+            error = InvalidRefreshToken("User is inactive")
+        elif refresh_token.revoked_at is not None:
+            revoked = RefreshToken.objects.filter(
+                family=refresh_token.family, revoked_at__isnull=True
+            ).update(revoked_at=now)
+            logger.warning(
+                "refresh_token_reused",
+                user_id=refresh_token.user_id,
+                family=str(refresh_token.family),
+                revoked=revoked,
+            )
+            error = InvalidRefreshToken("Refresh token has been revoked")
+        elif refresh_token.expires_at <= now:
+            error = InvalidRefreshToken("Refresh token has expired")
+        else:
+            error = None
+            refresh_token.revoked_at = now
+            refresh_token.save(update_fields=["revoked_at", "modified"])
+            tokens = issue_tokens(refresh_token.user, refresh_token.family)
+
+    # raised after the transaction so that a family revocation is committed
+    if error:
+        raise error
+    return refresh_token.user, tokens
+
+
+def revoke_refresh_tokens(user_id):
+    return RefreshToken.objects.filter(user_id=user_id, revoked_at__isnull=True).update(
+        revoked_at=timezone.now()
+    )
@@ -5,4 +5,5 @@ from . import views
 urlpatterns = [
     path("login", views.LoginView.as_view(), name="login"),
     path("register", views.RegisterView.as_view(), name="register"),
+    path("token/refresh", views.TokenRefreshView.as_view(), name="token-refresh"),
 ]
@@ -1,19 +1,30 @@
-from datetime import timedelta
-
-import jwt
-from django.conf import settings
-from django.contrib.auth import authenticate
-from django.utils import timezone
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.views import APIView
 
-from users.serializers import LoginSerializer, RegisterSerializer
+from users.serializers import (
+    LoginSerializer,
+    RegisterSerializer,
+    TokenRefreshSerializer,
+)
+from users.throttling import LoginEmailThrottle, LoginIPThrottle
+from users.tokens import InvalidRefreshToken, issue_tokens, rotate_refresh_token
+
+
+def get_user_data(user):
+    return {
+        "id": user.id,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+    }
 
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
     serializer_class = LoginSerializer
 
     def post(self, request):
@@ -21,42 +32,38 @@ class LoginView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        user = authenticate(
-            email=serializer.validated_data["email"],
-            password=serializer.validated_data["password"],
+        user = serializer.validated_data["user"]
+        response = Response(
+            {**issue_tokens(user), "user": get_user_data(user)},
+            status=status.HTTP_200_OK,
         )
+        return response
 
-        if user is None:
-            return Response(
-                {"message": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED
-            )
 
-        if not user.is_active:
-            return Response(
-                {"message": "Account is disabled"}, status=status.HTTP_403_FORBIDDEN
+class TokenRefreshView(APIView):
+    # an expired access token in the Authorization header must not fail the
+    # request before the refresh token is checked
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "token_refresh"
+    serializer_class = TokenRefreshSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user, tokens = rotate_refresh_token(
+                serializer.validated_data["refresh_token"]
             )
+        except InvalidRefreshToken as e:
+            return Response({"message": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
 
-        expires_at = timezone.now() + timedelta(days=1)
-        payload = {
-            "user_id": user.id,
-            "email": user.email,
-            "exp": expires_at,
-        }
-        token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm="HS256")
-        response = Response(
-            {
-                "token": token,
-                "expires_at": expires_at,
-                "user": {
-                    "id": user.id,
-                    "email": user.email,
-                    "first_name": user.first_name,
-                    "last_name": user.last_name,
-                },
-            },
-            status=status.HTTP_200_OK,
+        return Response(
+            {**tokens, "user": get_user_data(user)}, status=status.HTTP_200_OK
         )
-        return response
 
 
 class RegisterView(APIView):